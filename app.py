@@ -60,6 +60,10 @@ with app.app_context():
     # Import models for table creation
     import models
     db.create_all()
+    
+    # Bring databases created by older versions up to date
+    import migrations
+    migrations.upgrade_schema()
 
 if __name__ == "__main__":
     # Import routes only when running directly
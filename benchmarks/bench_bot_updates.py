@@ -0,0 +1,103 @@
+"""
+Update throughput benchmark for the Telegram bot.
+Pushes a burst of synthetic message updates from many chats through the
+bot's update processor the way python-telegram-bot's Application does (one
+task per update, in arrival order), with handlers that wait for a simulated
+Telegram API round trip. Reports updates per second for sequential and
+concurrent processing and checks that every chat saw its updates in order.
+
+Usage:
+    python benchmarks/bench_bot_updates.py --chats 2000 --messages 3 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the bot binds the application database; keep it away from real data
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from telegram import Update  # noqa: E402
+
+from bot import ChatOrderedUpdateProcessor  # noqa: E402
+
+
+def make_updates(chats: int, messages: int, seed: int):
+    """Interleaved message updates: every chat sends `messages` in a row, shuffled across chats"""
+    rng = random.Random(seed)
+    order = [chat for chat in range(chats) for _ in range(messages)]
+    rng.shuffle(order)
+    sent = defaultdict(int)
+    updates = []
+    for update_id, chat in enumerate(order):
+        sent[chat] += 1
+        updates.append(Update.de_json({
+            "update_id": update_id,
+            "message": {
+                "message_id": sent[chat],
+                "date": 0,
+                "chat": {"id": 100000 + chat, "type": "private"},
+                "from": {"id": 100000 + chat, "is_bot": False, "first_name": "bench"},
+                "text": f"message {sent[chat]}"
+            }
+        }, None))
+    return updates
+
+
+async def run(updates, max_concurrent: int, latency: float):
+    processor = ChatOrderedUpdateProcessor(max_concurrent)
+    seen = defaultdict(list)
+
+    async def handle(update: Update):
+        # A reply costs one round trip to the Telegram API
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        seen[update.effective_chat.id].append(update.message.message_id)
+
+    started = time.perf_counter()
+    async with processor:
+        await asyncio.gather(*(
+            asyncio.create_task(processor.process_update(update, handle(update))) for update in updates
+        ))
+    elapsed = time.perf_counter() - started
+
+    in_order = all(ids == sorted(ids) for ids in seen.values())
+    handled = sum(len(ids) for ids in seen.values())
+    return elapsed, handled, in_order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=2000, help="Number of chats messaging at once")
+    parser.add_argument("--messages", type=int, default=3, help="Messages sent by each chat")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Mean simulated Telegram API round trip")
+    parser.add_argument("--concurrency", type=int, default=256, help="Updates processed at once")
+    parser.add_argument("--sequential-sample", type=int, default=200, help="Updates timed with sequential processing")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the update order")
+    args = parser.parse_args()
+
+    updates = make_updates(args.chats, args.messages, args.seed)
+    latency = args.latency_ms / 1000
+    print(f"{len(updates):,} updates from {args.chats:,} chats, ~{args.latency_ms:g} ms per reply")
+
+    sample = updates[:args.sequential_sample]
+    elapsed, handled, _ = asyncio.run(run(sample, 1, latency))
+    sequential_rate = handled / elapsed
+    print(f"  {'sequential (1 at a time)':<32} {sequential_rate:8.0f} updates/s ({handled:,} timed)")
+
+    elapsed, handled, in_order = asyncio.run(run(updates, args.concurrency, latency))
+    concurrent_rate = handled / elapsed
+    label = f"concurrent ({args.concurrency} at a time)"
+    print(f"  {label:<32} {concurrent_rate:8.0f} updates/s ({handled:,} in {elapsed:.2f} s)")
+
+    if handled != len(updates) or not in_order:
+        sys.exit("Updates were lost or handled out of order within a chat!")
+    print(f"Every chat handled in order; speedup {concurrent_rate / sequential_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Query latency benchmark for the Solana Airdrop Bot.
+Fills a database with synthetic wallets and airdrop transactions, then times
+the queries behind the dashboard, the airdrop status API and wallet
+registration, with and without the model indexes.
+
+Usage:
+    python benchmarks/bench_queries.py --wallets 1000000 --transactions 10000000
+    python benchmarks/bench_queries.py --database postgresql://... --skip-load
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--database", default="sqlite:///bench_queries.db", help="Database URL to benchmark")
+parser.add_argument("--wallets", type=int, default=1_000_000, help="Number of wallet addresses")
+parser.add_argument("--users", type=int, default=250_000, help="Number of users owning the wallets")
+parser.add_argument("--events", type=int, default=100, help="Number of airdrop events")
+parser.add_argument("--transactions", type=int, default=10_000_000, help="Number of airdrop transactions")
+parser.add_argument("--iterations", type=int, default=200, help="Timed runs per query")
+parser.add_argument("--skip-load", action="store_true", help="Reuse data loaded by a previous run")
+args = parser.parse_args()
+
+# The application binds its database from the environment at import time
+os.environ["DATABASE_URL"] = args.database
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+from sqlalchemy.schema import CreateIndex, DropIndex  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import AirdropEvent, AirdropTransaction, User, WalletAddress  # noqa: E402
+
+CHUNK_SIZE = 20_000
+ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+STATUSES = ["success"] * 90 + ["failed"] * 8 + ["pending"] * 2
+
+
+def fake_address(n: int) -> str:
+    """Deterministic 44-character base58-looking address"""
+    rng = random.Random(n)
+    return "".join(rng.choice(ALPHABET) for _ in range(44))
+
+
+def insert_chunks(table, rows, total: int, label: str):
+    chunk = []
+    started = time.perf_counter()
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            db.session.execute(insert(table), chunk)
+            db.session.commit()
+            chunk = []
+    if chunk:
+        db.session.execute(insert(table), chunk)
+        db.session.commit()
+    print(f"  loaded {total:,} {label} in {time.perf_counter() - started:.1f}s")
+
+
+def load_data():
+    print("Loading data...")
+    now = datetime.utcnow()
+    insert_chunks(User, (
+        {"id": i, "username": f"bench_{i}", "email": f"bench_{i}@example.com", "created_at": now}
+        for i in range(1, args.users + 1)
+    ), args.users, "users")
+    insert_chunks(WalletAddress, (
+        {"address": fake_address(i), "user_id": i % args.users + 1, "is_validated": True, "created_at": now}
+        for i in range(args.wallets)
+    ), args.wallets, "wallets")
+    insert_chunks(AirdropEvent, (
+        {"id": i, "token_mint": fake_address(-i), "token_amount": 1.0, "token_decimals": 6,
+         "started_by": 1, "created_at": now - timedelta(hours=i)}
+        for i in range(1, args.events + 1)
+    ), args.events, "airdrop events")
+    insert_chunks(AirdropTransaction, (
+        {"event_id": i % args.events + 1, "wallet_address": fake_address(i % args.wallets),
+         "status": STATUSES[i % len(STATUSES)], "created_at": now}
+        for i in range(args.transactions)
+    ), args.transactions, "airdrop transactions")
+    for event_id in range(1, args.events + 1):
+        db.session.get(AirdropEvent, event_id).rebuild_counters()
+    db.session.commit()
+
+
+def timed(label: str, query):
+    samples = []
+    for i in range(args.iterations):
+        started = time.perf_counter()
+        query(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"  {label:<38} median {statistics.median(samples):9.3f} ms   p95 {p95:9.3f} ms")
+
+
+def run_queries():
+    def dashboard(i):
+        user_id = i * 7919 % args.users + 1
+        db.session.execute(select(WalletAddress).where(WalletAddress.user_id == user_id)).all()
+        db.session.execute(select(AirdropEvent).order_by(AirdropEvent.created_at.desc()).limit(5)).all()
+
+    def status_api(i):
+        db.session.get(AirdropEvent, i % args.events + 1)
+        db.session.expunge_all()
+
+    def status_verify(i):
+        AirdropEvent.count_statuses([i % args.events + 1])
+
+    def registration(i):
+        n = i * 104729 % args.wallets
+        db.session.execute(select(WalletAddress).where(
+            WalletAddress.address == fake_address(n),
+            WalletAddress.user_id == n % args.users + 1
+        )).first()
+
+    timed("dashboard (wallets + recent events)", dashboard)
+    timed("status API (counter row)", status_api)
+    timed("status API ?verify=1 (grouped count)", status_verify)
+    timed("registration duplicate check", registration)
+
+
+def main():
+    with app.app_context():
+        if not args.skip_load:
+            if db.session.scalar(select(func.count()).select_from(WalletAddress)):
+                sys.exit("Database already contains data; use --skip-load or an empty database")
+            load_data()
+
+        # Refresh planner statistics after the bulk load
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+
+        print("With indexes:")
+        run_queries()
+
+        print("Without indexes:")
+        for index in indexes:
+            db.session.execute(DropIndex(index))
+        db.session.commit()
+        try:
+            run_queries()
+        finally:
+            for index in indexes:
+                db.session.execute(CreateIndex(index))
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
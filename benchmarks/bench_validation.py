@@ -0,0 +1,87 @@
+"""
+Address validation benchmark for the Solana Airdrop Bot.
+Times the batch validator against the scalar one (and against the original
+regex + full base58 decode) on a synthetic mix of valid and invalid addresses,
+and checks that all of them agree.
+
+Usage:
+    python benchmarks/bench_validation.py --addresses 1000000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+import base58
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import BASE58_ALPHABET, validate_solana_address, validate_solana_addresses  # noqa: E402
+
+
+def legacy_validate(address: str) -> bool:
+    """The original scalar check: uncompiled regex plus a full base58 decode"""
+    try:
+        if not re.match(r'^[1-9A-HJ-NP-Za-km-z]{32,44}$', address):
+            return False
+        return len(base58.b58decode(address)) == 32
+    except Exception:
+        return False
+
+
+def make_addresses(count: int, seed: int):
+    """Roughly 70% valid addresses, the rest malformed in various ways"""
+    rng = random.Random(seed)
+    addresses = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            addresses.append(base58.b58encode(rng.randbytes(32)).decode())
+        elif kind < 0.8:
+            addresses.append(base58.b58encode(rng.randbytes(rng.choice([31, 33]))).decode())
+        elif kind < 0.9:
+            addresses.append("".join(rng.choice(BASE58_ALPHABET) for _ in range(rng.randint(28, 48))))
+        else:
+            address = base58.b58encode(rng.randbytes(32)).decode()
+            position = rng.randrange(len(address))
+            addresses.append(address[:position] + rng.choice("0OIl+/") + address[position + 1:])
+    return addresses
+
+
+def timed(label: str, function, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<36} {best:8.3f} s")
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--addresses", type=int, default=1_000_000, help="Number of addresses to validate")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per validator (best is reported)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic addresses")
+    args = parser.parse_args()
+
+    print(f"Generating {args.addresses:,} addresses...")
+    addresses = make_addresses(args.addresses, args.seed)
+
+    print("Validating:")
+    legacy, legacy_time = timed("legacy (regex + b58decode)", lambda: [legacy_validate(a) for a in addresses], args.repeat)
+    scalar, scalar_time = timed("validate_solana_address loop", lambda: [validate_solana_address(a) for a in addresses], args.repeat)
+    batch, batch_time = timed("validate_solana_addresses batch", lambda: validate_solana_addresses(addresses), args.repeat)
+
+    if not (legacy == scalar == [bool(flag) for flag in batch]):
+        sys.exit("Validators disagree!")
+
+    print(f"{sum(batch):,} of {len(batch):,} addresses valid; result array is {len(batch):,} bytes")
+    print(f"Batch speedup: {legacy_time / batch_time:.1f}x over legacy, {scalar_time / batch_time:.1f}x over scalar")
+
+
+if __name__ == "__main__":
+    main()
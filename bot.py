@@ -2,46 +2,170 @@
 Telegram bot implementation for Solana Airdrop Bot.
 This module handles all Telegram bot interactions for wallet registration
 and airdrop notifications.
+
+Updates are handled concurrently, up to config.BOT_MAX_CONCURRENT_UPDATES at
+a time, while the updates of any one chat are still handled in the order they
+arrived. They come either from long polling or, with BOT_UPDATE_MODE=webhook,
+from the web application: Telegram posts them to WEBHOOK_PATH on any web
+process, which verifies the secret token and hands them to its in-process bot
+(see start_bot and TelegramBot.feed_update).
 """
 import logging
 import asyncio
+import functools
+import hashlib
 import threading
-from typing import Optional, List, Dict, Any, Callable
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Callable, Tuple
 from datetime import datetime
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
-    CallbackQueryHandler,
     ContextTypes,
     filters,
 )
 
 import config
 import presets
-from models import User, WalletAddress, AirdropEvent, AirdropTransaction
-from app import db
-from utils import validate_solana_address, format_solana_address, process_airdrop_transaction
+from models import User, WalletAddress, AirdropEvent
+from app import app, db
+from utils import validate_solana_address, format_solana_address
+from dispatch import recipient_addresses, snapshot_recipients
+from worker import enqueue_airdrop
 
 logger = logging.getLogger(__name__)
 
 # Global reference to the bot instance
 telegram_bot = None
+_bot_lock = threading.Lock()
+
+# Web application route Telegram posts updates to in webhook mode
+WEBHOOK_PATH = "/telegram/webhook"
+
+# How long a webhook update waits for a starting bot before it is refused
+WEBHOOK_READY_TIMEOUT_SECONDS = 5
 
 def is_running() -> bool:
     """Check if the Telegram bot is running"""
     return telegram_bot is not None and telegram_bot.is_running
 
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates concurrently while keeping each chat's updates in order.
+    An update for a chat that is already being served is queued behind it and
+    handled by the same task, so a busy chat occupies one processing slot
+    however many messages it sends, and the remaining slots keep serving
+    other chats. A chat's queue is capped; updates beyond the cap are dropped
+    so one flooding chat cannot pile up unbounded work.
+    """
+    
+    def __init__(self, max_concurrent_updates: int, max_chat_backlog: Optional[int] = None):
+        super().__init__(max_concurrent_updates)
+        self.max_chat_backlog = max_chat_backlog or config.BOT_MAX_CHAT_BACKLOG
+        self._chats: Dict[int, deque] = {}
+        
+    async def do_process_update(self, update: object, coroutine):
+        chat_id = _chat_id(update)
+        if chat_id is None:
+            await coroutine
+            return
+            
+        backlog = self._chats.get(chat_id)
+        if backlog is not None:
+            if len(backlog) >= self.max_chat_backlog:
+                logger.warning(f"Dropping update for chat {chat_id}: {len(backlog)} updates already queued")
+                coroutine.close()
+                return
+            # The task serving this chat picks it up after the earlier updates
+            backlog.append(coroutine)
+            return
+            
+        backlog = self._chats[chat_id] = deque([coroutine])
+        try:
+            while backlog:
+                try:
+                    await backlog.popleft()
+                except Exception as e:
+                    logger.error(f"Error processing update for chat {chat_id}: {e}")
+        finally:
+            del self._chats[chat_id]
+            # Only left over if the task was cancelled during shutdown
+            for pending in backlog:
+                pending.close()
+                
+    async def initialize(self):
+        pass
+        
+    async def shutdown(self):
+        pass
+
+def _chat_id(update: object) -> Optional[int]:
+    """Chat (or failing that, user) an update belongs to, for ordering"""
+    if isinstance(update, Update):
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+    return None
+
+def webhook_secret_token() -> str:
+    """Secret Telegram sends with every webhook request (X-Telegram-Bot-Api-Secret-Token)"""
+    if config.WEBHOOK_SECRET_TOKEN:
+        return config.WEBHOOK_SECRET_TOKEN
+    # Stable across web processes without extra configuration
+    return hashlib.sha256(f"webhook:{config.BOT_TOKEN}".encode()).hexdigest()
+
+def start_bot() -> "TelegramBot":
+    """Start the in-process Telegram bot if it is not already running"""
+    global telegram_bot
+    with _bot_lock:
+        if telegram_bot is None or not telegram_bot.is_running:
+            telegram_bot = TelegramBot(token=config.BOT_TOKEN)
+            telegram_bot.start()
+        return telegram_bot
+
+def _in_app_context(function: Callable, *args):
+    """Call a function in a fresh application context; its session is removed on exit"""
+    with app.app_context():
+        return function(*args)
+
 class TelegramBot:
-    """Telegram bot for Solana airdrop management"""
+    """
+    Telegram bot for Solana airdrop management.
+    Handlers never touch the database on the event loop: each data access
+    runs on a small thread pool in an application context of its own, so it
+    gets its own scoped session and a slow query or commit only holds up the
+    update that made it.
+    """
     
     def __init__(self, token: str):
         """Initialize the bot with a token"""
         self.token = token
-        self.application = Application.builder().token(token).build()
+        self.webhook_mode = config.BOT_UPDATE_MODE == 'webhook'
+        api_url = config.TELEGRAM_API_BASE_URL.rstrip('/')
+        builder = Application.builder().token(token).base_url(f"{api_url}/bot").base_file_url(
+            f"{api_url}/file/bot"
+        ).concurrent_updates(
+            ChatOrderedUpdateProcessor(config.BOT_MAX_CONCURRENT_UPDATES)
+        )
+        if self.webhook_mode:
+            # Updates are pushed in by the web application instead of polled
+            builder = builder.updater(None)
+        self.application = builder.build()
         self.is_running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+        self._db_executor = ThreadPoolExecutor(
+            max_workers=config.BOT_DB_WORKERS,
+            thread_name_prefix="bot-db"
+        )
         self._setup_handlers()
         
     def _setup_handlers(self):
@@ -80,29 +204,13 @@ class TelegramBot:
             await update.message.reply_text(presets.REGISTER_INVALID)
             return
             
-        # Get or create user
-        user = self._get_or_create_user(update.effective_user)
-        
-        # Check if wallet already exists for this user
-        existing_wallet = WalletAddress.query.filter_by(
-            address=wallet_address,
-            user_id=user.id
-        ).first()
+        # Save the wallet for this user unless it is already registered
+        registered = await self._run_db(self._register_wallet, update.effective_user, wallet_address)
         
-        if existing_wallet:
+        if not registered:
             await update.message.reply_text(presets.REGISTER_ALREADY_EXISTS)
             return
             
-        # Create new wallet address
-        wallet = WalletAddress(
-            address=wallet_address,
-            user_id=user.id,
-            label=f"Telegram {datetime.utcnow().strftime('%Y-%m-%d')}"
-        )
-        
-        db.session.add(wallet)
-        db.session.commit()
-        
         # Send confirmation
         formatted_address = format_solana_address(wallet_address)
         await update.message.reply_text(
@@ -111,26 +219,23 @@ class TelegramBot:
         
     async def wallet_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /wallet command to show registered wallets"""
-        # Get user
-        user = self._get_or_create_user(update.effective_user)
-        
         # Get all wallets for this user
         try:
-            wallets = WalletAddress.query.filter_by(user_id=user.id).all()
+            wallets = await self._run_db(self._wallet_addresses, update.effective_user)
             
             if not wallets:
                 await update.message.reply_text(presets.WALLET_NONE)
                 return
                 
             if len(wallets) == 1:
-                wallet_text = format_solana_address(wallets[0].address)
+                wallet_text = format_solana_address(wallets[0])
                 await update.message.reply_text(
                     presets.WALLET_DISPLAY.format(wallet_text)
                 )
             else:
                 wallet_list = "\n".join([
-                    f"{i+1}. {format_solana_address(w.address)}"
-                    for i, w in enumerate(wallets)
+                    f"{i+1}. {format_solana_address(address)}"
+                    for i, address in enumerate(wallets)
                 ])
                 await update.message.reply_text(
                     presets.WALLET_MULTIPLE.format(wallet_list)
@@ -162,77 +267,35 @@ class TelegramBot:
             await update.message.reply_text(presets.AIRDROP_INVALID_ARGS)
             return
             
+        # Optionally skip wallets already paid this token
+        exclude_paid = len(context.args) > 3 and context.args[3].lower() == 'new'
+        
         # Check if sender wallet is configured
         if not config.SENDER_SECRET_KEY:
             await update.message.reply_text(presets.AIRDROP_NO_SENDER)
             return
             
-        # Get all registered wallets
-        wallets = WalletAddress.query.all()
-        
-        if not wallets:
+        # Check that there is anyone to airdrop to
+        if not await self._run_db(self._has_wallets):
             await update.message.reply_text(presets.AIRDROP_NO_WALLETS)
             return
             
-        # Create airdrop event
-        user = self._get_or_create_user(update.effective_user)
-        airdrop = AirdropEvent(
-            token_mint=token_mint,
-            token_amount=amount,
-            token_decimals=decimals,
-            started_by=user.id
+        # Create the airdrop event and its pending transaction records
+        airdrop_id, recipient_count = await self._run_db(
+            self._create_airdrop, update.effective_user, token_mint, amount, decimals, exclude_paid
         )
-        db.session.add(airdrop)
-        db.session.commit()
+        
+        if airdrop_id is None:
+            await update.message.reply_text(presets.AIRDROP_NO_ELIGIBLE)
+            return
         
         # Send response that airdrop has started
         await update.message.reply_text(
-            presets.AIRDROP_STARTED.format(amount, len(wallets))
+            presets.AIRDROP_STARTED.format(amount, recipient_count)
         )
         
-        # Start airdrop in background
-        asyncio.create_task(self._process_airdrop(airdrop.id, wallets, token_mint, amount, decimals))
-        
-    async def _process_airdrop(self, event_id: int, wallets: List[WalletAddress], 
-                              token_mint: str, amount: float, decimals: int):
-        """Process airdrop transactions in background"""
-        logger.info(f"Starting airdrop {event_id} to {len(wallets)} wallets")
-        
-        for wallet in wallets:
-            # Create transaction record
-            transaction = AirdropTransaction(
-                event_id=event_id,
-                wallet_address=wallet.address,
-                status='pending'
-            )
-            db.session.add(transaction)
-            db.session.commit()
-            
-            # Process transaction
-            try:
-                result = await process_airdrop_transaction(
-                    wallet_address=wallet.address,
-                    token_mint=token_mint,
-                    token_amount=amount,
-                    token_decimals=decimals,
-                    sender_secret_key=config.SENDER_SECRET_KEY
-                )
-                
-                # Update transaction record
-                transaction.status = 'success' if result['success'] else 'failed'
-                transaction.transaction_signature = result.get('signature', None)
-                transaction.error_message = result.get('error', None)
-                transaction.completed_at = datetime.utcnow()
-                db.session.commit()
-                
-            except Exception as e:
-                logger.error(f"Error processing airdrop to {wallet.address}: {e}")
-                transaction.status = 'failed'
-                transaction.error_message = str(e)
-                transaction.completed_at = datetime.utcnow()
-                db.session.commit()
-        
-        logger.info(f"Airdrop {event_id} completed")
+        # Hand the airdrop to the job queue
+        enqueue_airdrop(airdrop_id)
        
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle text messages"""
@@ -290,8 +353,89 @@ class TelegramBot:
             error_msg = presets.GENERIC_ERROR.format(str(context.error))
             await update.effective_message.reply_text(error_msg)
             
+    async def _run_db(self, function: Callable, *args):
+        """
+        Run blocking data access on the bot's database threads.
+        
+        Args:
+            function: Callable using the database session
+            *args: Arguments for the callable
+            
+        Returns:
+            The callable's result, which must not be a session-bound object
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._db_executor, functools.partial(_in_app_context, function, *args)
+        )
+        
+    def _register_wallet(self, telegram_user, wallet_address: str) -> bool:
+        """Save a wallet for a Telegram user; False if they already registered it"""
+        user = self._get_or_create_user(telegram_user)
+        
+        # Check if wallet already exists for this user
+        existing_wallet = WalletAddress.query.filter_by(
+            address=wallet_address,
+            user_id=user.id
+        ).first()
+        
+        if existing_wallet:
+            return False
+            
+        # Create new wallet address
+        wallet = WalletAddress(
+            address=wallet_address,
+            user_id=user.id,
+            label=f"Telegram {datetime.utcnow().strftime('%Y-%m-%d')}"
+        )
+        
+        db.session.add(wallet)
+        db.session.commit()
+        return True
+        
+    def _wallet_addresses(self, telegram_user) -> List[str]:
+        """Addresses of the wallets a Telegram user registered"""
+        user = self._get_or_create_user(telegram_user)
+        return [
+            address for (address,) in
+            db.session.query(WalletAddress.address).filter_by(user_id=user.id).order_by(WalletAddress.id)
+        ]
+        
+    def _has_wallets(self) -> bool:
+        """Check whether any wallet is registered at all"""
+        return db.session.query(WalletAddress.id).first() is not None
+        
+    def _create_airdrop(self, telegram_user, token_mint: str, amount: float, decimals: int,
+                        exclude_paid: bool) -> Tuple[Optional[int], int]:
+        """
+        Create an airdrop event and freeze its eligible recipients into
+        pending transaction records up front.
+        
+        Returns:
+            tuple: Airdrop event ID (None if nobody was eligible) and recipient count
+        """
+        user = self._get_or_create_user(telegram_user)
+        airdrop = AirdropEvent(
+            token_mint=token_mint,
+            token_amount=amount,
+            token_decimals=decimals,
+            started_by=user.id
+        )
+        db.session.add(airdrop)
+        db.session.commit()
+        
+        recipient_count = snapshot_recipients(
+            airdrop.id, recipient_addresses(token_mint, exclude_paid=exclude_paid)
+        )
+        
+        if recipient_count == 0:
+            db.session.delete(airdrop)
+            db.session.commit()
+            return None, 0
+        return airdrop.id, recipient_count
+        
     def _get_or_create_user(self, telegram_user) -> User:
-        """Get or create a user record for a Telegram user"""
+        """Get or create a user record for a Telegram user (on a database thread)"""
         telegram_id = str(telegram_user.id)
         
         # Look for existing user
@@ -331,20 +475,75 @@ class TelegramBot:
             logger.warning("Bot is already running")
             return
             
-        # Run the bot in a separate thread
+        # Run the bot in a separate thread, on a loop that can take updates right away
+        self._loop = asyncio.new_event_loop()
+        self._stopped = asyncio.Event()
+        
         def run_bot():
             try:
-                asyncio.set_event_loop(asyncio.new_event_loop())
-                self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+                asyncio.set_event_loop(self._loop)
+                if self.webhook_mode:
+                    self._loop.run_until_complete(self._serve_webhook_updates())
+                    self._loop.close()
+                else:
+                    # Signal handlers can only be installed on the main thread
+                    self.application.run_polling(allowed_updates=Update.ALL_TYPES, stop_signals=None)
             except Exception as e:
                 logger.error(f"Error running Telegram bot: {e}")
-                self.is_running = False
+            self.is_running = False
                 
         self.bot_thread = threading.Thread(target=run_bot)
         self.bot_thread.daemon = True
-        self.bot_thread.start()
         self.is_running = True
-        logger.info("Telegram bot started")
+        self.bot_thread.start()
+        logger.info(f"Telegram bot started ({config.BOT_UPDATE_MODE} mode)")
+        
+    async def _serve_webhook_updates(self):
+        """Run the application without an updater until the bot is stopped"""
+        async with self.application:
+            await self.application.start()
+            self._ready.set()
+            try:
+                # Every web process registers the same URL; one success is enough
+                try:
+                    await self.application.bot.set_webhook(
+                        url=config.WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH,
+                        secret_token=webhook_secret_token(),
+                        allowed_updates=Update.ALL_TYPES
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not register the Telegram webhook: {e}")
+                await self._stopped.wait()
+            finally:
+                self._ready.clear()
+                await self.application.stop()
+                
+    def feed_update(self, data: dict) -> bool:
+        """
+        Queue an update received by the web application (thread-safe).
+        
+        Args:
+            data: Update as JSON-decoded from Telegram
+            
+        Returns:
+            bool: False if the bot is not running in webhook mode, or could
+                  not finish starting, so Telegram delivers the update again
+        """
+        if not self.webhook_mode:
+            return False
+        # Accepting an update the bot never starts to process would lose it
+        deadline = time.monotonic() + WEBHOOK_READY_TIMEOUT_SECONDS
+        while not self._ready.is_set():
+            if not self.is_running or time.monotonic() >= deadline:
+                return False
+            self._ready.wait(0.05)
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return False
+        # Parsed here so a malformed update is rejected to the caller
+        update = Update.de_json(data, self.application.bot)
+        loop.call_soon_threadsafe(self.application.update_queue.put_nowait, update)
+        return True
         
     def stop(self):
         """Stop the bot"""
@@ -353,12 +552,14 @@ class TelegramBot:
             return
             
         try:
-            # Stop the application
-            if self.application:
-                asyncio.run_coroutine_threadsafe(
-                    self.application.stop(), 
-                    self.application.update_queue.loop
-                )
+            # Stop the application on its own event loop
+            if self._loop is not None and not self._loop.is_closed():
+                if self.webhook_mode:
+                    if self._stopped is not None:
+                        self._loop.call_soon_threadsafe(self._stopped.set)
+                else:
+                    self._loop.call_soon_threadsafe(self.application.stop_running)
+            self._db_executor.shutdown(wait=False)
             self.is_running = False
             logger.info("Telegram bot stopped")
         except Exception as e:
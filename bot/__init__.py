@@ -1,7 +0,0 @@
-"""
-Bot module for the Solana Airdrop Bot
-"""
-from bot.telegram_bot import TelegramBot, is_running
-
-# Initialize global bot instance
-telegram_bot = None
\ No newline at end of file
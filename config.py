@@ -24,14 +24,61 @@ BOT_USERNAME = os.environ.get("BOT_USERNAME", "@OVOCOINAIRDROP_bot")
 # Default admin user IDs - users who can trigger airdrops
 _default_admin_ids = "798521346"  # Add your Telegram user ID here
 ADMIN_USER_IDS = os.environ.get("ADMIN_USER_IDS", _default_admin_ids).split(",")
+BOT_DB_WORKERS = int(os.environ.get("BOT_DB_WORKERS", "8"))  # Threads running the bot's database calls
+BOT_UPDATE_MODE = os.environ.get("BOT_UPDATE_MODE", "polling").lower()  # polling, or webhook behind the web app
+BOT_MAX_CONCURRENT_UPDATES = int(os.environ.get("BOT_MAX_CONCURRENT_UPDATES", "256"))  # Updates handled at once, in order per chat
+BOT_MAX_CHAT_BACKLOG = int(os.environ.get("BOT_MAX_CHAT_BACKLOG", "20"))  # Updates queued per chat before further ones are dropped
+WEBHOOK_BASE_URL = os.environ.get("WEBHOOK_BASE_URL", "https://sol-airdrop.pella.app")  # Public URL of the web app, for webhook mode
+WEBHOOK_SECRET_TOKEN = os.environ.get("WEBHOOK_SECRET_TOKEN", "")  # Required on webhook requests (derived from BOT_TOKEN if empty)
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org")  # Bot API server (e.g. a local fake in tests)
 
 # Solana Configuration
 SOLANA_RPC = os.environ.get("SOLANA_RPC", "https://api.mainnet-beta.solana.com")
+SOLANA_SIMULATE_SENDS = os.environ.get("SOLANA_SIMULATE_SENDS", "True").lower() in ("true", "1", "t", "yes")  # Mock signatures, reported confirmed without RPC
+SOLANA_RPC_READS = os.environ.get("SOLANA_RPC_READS", "False").lower() in ("true", "1", "t", "yes")  # Read blockhashes and token accounts from the RPC
+RPC_TIMEOUT_SECONDS = float(os.environ.get("RPC_TIMEOUT_SECONDS", "10"))  # Per-request RPC timeout
+# Optional weighted failover list, "url|weight,url|weight" (defaults to SOLANA_RPC alone)
+SOLANA_RPC_URLS = os.environ.get("SOLANA_RPC_URLS", "")
+RPC_ENDPOINT_CONCURRENCY = int(os.environ.get("RPC_ENDPOINT_CONCURRENCY", "8"))  # Initial HTTP requests in flight per RPC endpoint
+RPC_MAX_ENDPOINT_CONCURRENCY = int(os.environ.get("RPC_MAX_ENDPOINT_CONCURRENCY", "64"))  # Upper bound of the adaptive limit
+RPC_LATENCY_TOLERANCE = float(os.environ.get("RPC_LATENCY_TOLERANCE", "2"))  # Latency (x best seen) up to which the limit grows
+RPC_BATCH_SIZE = int(os.environ.get("RPC_BATCH_SIZE", "10"))  # JSON-RPC calls per HTTP request
+RPC_KEEPALIVE_SECONDS = float(os.environ.get("RPC_KEEPALIVE_SECONDS", "30"))  # Idle pooled connection lifetime
+RPC_FAILOVER_COOLDOWN_SECONDS = float(os.environ.get("RPC_FAILOVER_COOLDOWN_SECONDS", "1"))  # First cooldown of a failing endpoint
+RPC_FAILOVER_COOLDOWN_MAX_SECONDS = float(os.environ.get("RPC_FAILOVER_COOLDOWN_MAX_SECONDS", "60"))  # Cooldown cap
+BLOCKHASH_TTL_SECONDS = float(os.environ.get("BLOCKHASH_TTL_SECONDS", "60"))  # Usable lifetime of a fetched blockhash (~150 slots)
+BLOCKHASH_REFRESH_MARGIN_SECONDS = float(os.environ.get("BLOCKHASH_REFRESH_MARGIN_SECONDS", "20"))  # Refresh this long before expiry
 # Default SPL token mint address
 SPL_TOKEN_MINT = os.environ.get("SPL_TOKEN_MINT", "7d7jZLzHHefeSDqJj9EJhTrA1Ujmsb3saxs5vPdtpump")
 SPL_TOKEN_AMOUNT = float(os.environ.get("SPL_TOKEN_AMOUNT", "1200"))  # Amount per wallet
 SPL_TOKEN_DECIMALS = int(os.environ.get("SPL_TOKEN_DECIMALS", "6"))  # Number of decimal places
 
+# Airdrop dispatch configuration
+AIRDROP_MAX_IN_FLIGHT = int(os.environ.get("AIRDROP_MAX_IN_FLIGHT", "32"))  # Transactions in flight at once
+AIRDROP_MAX_TRANSFERS_PER_TX = int(os.environ.get("AIRDROP_MAX_TRANSFERS_PER_TX", "0"))  # 0 = as many as fit in a packet
+AIRDROP_RPC_RATE_LIMIT = float(os.environ.get("AIRDROP_RPC_RATE_LIMIT", "40"))  # Request rate ceiling per RPC endpoint (0 = none)
+AIRDROP_RESULT_BATCH_SIZE = int(os.environ.get("AIRDROP_RESULT_BATCH_SIZE", "500"))  # Results per bulk UPDATE
+AIRDROP_RESULT_FLUSH_MS = int(os.environ.get("AIRDROP_RESULT_FLUSH_MS", "500"))  # Max delay before results are written
+
+# Airdrop job queue configuration
+AIRDROP_WORKER_ENABLED = os.environ.get("AIRDROP_WORKER_ENABLED", "True").lower() in ("true", "1", "t", "yes")
+AIRDROP_CLAIM_BATCH_SIZE = int(os.environ.get("AIRDROP_CLAIM_BATCH_SIZE", "1000"))  # Transactions claimed per chunk
+AIRDROP_LEASE_SECONDS = int(os.environ.get("AIRDROP_LEASE_SECONDS", "120"))  # Claim lifetime without a heartbeat
+AIRDROP_WORKER_POLL_SECONDS = float(os.environ.get("AIRDROP_WORKER_POLL_SECONDS", "5"))  # Idle queue polling interval
+AIRDROP_PROGRESS_REFRESH_SECONDS = float(os.environ.get("AIRDROP_PROGRESS_REFRESH_SECONDS", "2"))  # Progress stream fallback refresh
+AIRDROP_PROGRESS_MAX_STREAMS = int(os.environ.get("AIRDROP_PROGRESS_MAX_STREAMS", "4"))  # Open progress streams per web process; each holds a request worker
+AIRDROP_MAX_ATTEMPTS = int(os.environ.get("AIRDROP_MAX_ATTEMPTS", "5"))  # Sends per transfer before a transient failure is final
+AIRDROP_RETRY_BASE_SECONDS = float(os.environ.get("AIRDROP_RETRY_BASE_SECONDS", "5"))  # Backoff before the first retry
+AIRDROP_RETRY_MAX_SECONDS = float(os.environ.get("AIRDROP_RETRY_MAX_SECONDS", "300"))  # Backoff ceiling
+CONFIRMATION_POLL_SECONDS = float(os.environ.get("CONFIRMATION_POLL_SECONDS", "2"))  # Signature status polling interval
+CONFIRMATION_SCAN_LIMIT = int(os.environ.get("CONFIRMATION_SCAN_LIMIT", "10240"))  # Sent transactions checked per poll
+CONFIRMATION_COMMITMENT = os.environ.get("CONFIRMATION_COMMITMENT", "confirmed")  # confirmed or finalized
+CONFIRMATION_MAX_RESIGNS = int(os.environ.get("CONFIRMATION_MAX_RESIGNS", "3"))  # Re-signs after blockhash expiry before the transfer goes back to retry
+ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", "50"))  # Rows per admin list page
+ADDRESS_CACHE_SIZE = int(os.environ.get("ADDRESS_CACHE_SIZE", "65536"))  # Memoized address validations/formats
+ATA_DERIVATION_WORKERS = int(os.environ.get("ATA_DERIVATION_WORKERS", "0"))  # Token account derivation processes (0 = CPU count)
+ATA_DERIVATION_POOL_THRESHOLD = int(os.environ.get("ATA_DERIVATION_POOL_THRESHOLD", "256"))  # Smaller batches derive inline
+
 # Sender wallet configuration
 # The SENDER_SECRET_KEY can be provided as a string (base58 encoded) or as a comma-separated list of integers
 # Default value is the actual secret key provided
@@ -51,6 +98,12 @@ if not ADMIN_USER_IDS or ADMIN_USER_IDS == [""]:
 if not SENDER_SECRET_KEY:
     logging.warning("SENDER_SECRET_KEY not set. Airdrops will not function without a valid sender wallet.")
 
+if not SOLANA_SIMULATE_SENDS:
+    # Signatures of simulated sends were never broadcast, so the cluster
+    # would never confirm them and the transfers would stay 'sent' forever
+    logging.warning("SOLANA_SIMULATE_SENDS is off, but only simulated sends are implemented. Keeping it on.")
+    SOLANA_SIMULATE_SENDS = True
+
 # Helper functions to pass data to templates
 def get_config_for_templates() -> Dict[str, Any]:
     """Get a dictionary of configuration values for templates"""
@@ -83,7 +136,8 @@ def update_config(updates: Dict[str, Any]) -> None:
         updates: Dictionary of configuration key-value pairs to update
     """
     global BOT_USERNAME, BOT_TOKEN, ADMIN_USER_IDS, SPL_TOKEN_MINT, SPL_TOKEN_AMOUNT
-    global SPL_TOKEN_DECIMALS, SOLANA_RPC, SENDER_SECRET_KEY, DEBUG, ENABLE_ADMIN_TOKEN
+    global SPL_TOKEN_DECIMALS, SOLANA_RPC, SOLANA_RPC_URLS, SENDER_SECRET_KEY, DEBUG, ENABLE_ADMIN_TOKEN
+    global AIRDROP_MAX_IN_FLIGHT, AIRDROP_RPC_RATE_LIMIT
     
     # Update the module-level variables
     for key, value in updates.items():
@@ -111,6 +165,15 @@ def update_config(updates: Dict[str, Any]) -> None:
         elif key == "SOLANA_RPC":
             SOLANA_RPC = value
             os.environ["SOLANA_RPC"] = value
+        elif key == "SOLANA_RPC_URLS":
+            SOLANA_RPC_URLS = value if isinstance(value, str) else ",".join(value)
+            os.environ["SOLANA_RPC_URLS"] = SOLANA_RPC_URLS
+        elif key == "AIRDROP_MAX_IN_FLIGHT":
+            AIRDROP_MAX_IN_FLIGHT = int(value)
+            os.environ["AIRDROP_MAX_IN_FLIGHT"] = str(value)
+        elif key == "AIRDROP_RPC_RATE_LIMIT":
+            AIRDROP_RPC_RATE_LIMIT = float(value)
+            os.environ["AIRDROP_RPC_RATE_LIMIT"] = str(value)
         elif key == "SENDER_SECRET_KEY":
             SENDER_SECRET_KEY = value
             os.environ["SENDER_SECRET_KEY"] = value
@@ -124,4 +187,3 @@ def update_config(updates: Dict[str, Any]) -> None:
             logging.warning(f"Unknown configuration key: {key}")
     
     logging.info(f"Configuration updated with {len(updates)} values")
-WEBHOOK_BASE_URL = "https://sol-airdrop.pella.app"
\ No newline at end of file
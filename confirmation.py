@@ -0,0 +1,378 @@
+"""
+Confirmation tracking for sent airdrop transactions.
+The dispatcher records every transfer it sends as 'sent' with its
+transaction signature. One tracker per worker polls the outstanding
+signatures on a single timer, GET_SIGNATURE_STATUSES_LIMIT per
+getSignatureStatuses call, and moves the rows to 'success' or 'failed' in
+bulk, so confirming N transfers costs about N / 256 RPC calls instead of N.
+Each tick leases the signatures it polls, so several workers split the
+outstanding transactions between them instead of all checking every one.
+Transactions that never landed and whose blockhash has expired are re-signed
+with a fresh blockhash and sent again, once the ledger history confirms they
+are unknown.
+"""
+import asyncio
+import logging
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, update
+
+import config
+from app import app, db
+from dispatch import load_airdrop_context, resolve_token_accounts, transaction_result_row, write_transaction_results
+from models import AirdropEvent, AirdropTransaction
+import progress
+from utils import (
+    AirdropContext,
+    blockhash_cache,
+    fetch_block_height,
+    fetch_signature_statuses,
+    process_airdrop_batch_transaction
+)
+
+logger = logging.getLogger(__name__)
+
+# A sent transaction: all transfers sharing one signature
+SentTransaction = namedtuple("SentTransaction", ["signature", "event_id", "sent_at", "last_valid_block_height"])
+
+# Rows updated per UPDATE ... WHERE transaction_signature IN (...)
+_UPDATE_CHUNK_SIZE = 500
+
+# Confirmation levels accepted for each configured commitment
+_CONFIRMED_STATUSES = {
+    'confirmed': ('confirmed', 'finalized'),
+    'finalized': ('finalized',),
+}
+
+
+def _leasable(worker_id: str, now: datetime):
+    """Sent rows no other tracker is polling or re-signing"""
+    return or_(
+        AirdropTransaction.lease_expires_at.is_(None),
+        AirdropTransaction.lease_expires_at < now,
+        AirdropTransaction.lease_owner == worker_id
+    )
+
+
+def lease_outstanding_transactions(worker_id: str, limit: int, lease_seconds: int) -> List[SentTransaction]:
+    """
+    Lease up to `limit` sent transactions awaiting confirmation, oldest first.
+    Signatures leased by another live tracker are skipped; the lease is taken
+    in one UPDATE ... RETURNING, so concurrent trackers never poll the same
+    signature.
+
+    Args:
+        worker_id: Identifier of the polling tracker
+        limit: Maximum number of transactions (signatures) to lease
+        lease_seconds: How long the lease lasts if the tracker stops renewing it
+
+    Returns:
+        list: Leased transactions, oldest first
+    """
+    with app.app_context():
+        now = datetime.utcnow()
+        signatures = (
+            select(AirdropTransaction.transaction_signature)
+            .where(
+                AirdropTransaction.status == 'sent',
+                AirdropTransaction.transaction_signature.isnot(None),
+                _leasable(worker_id, now)
+            )
+            .group_by(AirdropTransaction.transaction_signature)
+            .order_by(func.min(AirdropTransaction.sent_at))
+            .limit(limit)
+        )
+        try:
+            rows = db.session.execute(
+                update(AirdropTransaction)
+                .where(
+                    AirdropTransaction.status == 'sent',
+                    AirdropTransaction.transaction_signature.in_(signatures.scalar_subquery()),
+                    _leasable(worker_id, now)
+                )
+                .values(lease_owner=worker_id, lease_expires_at=now + timedelta(seconds=lease_seconds))
+                .returning(
+                    AirdropTransaction.transaction_signature,
+                    AirdropTransaction.event_id,
+                    AirdropTransaction.sent_at,
+                    AirdropTransaction.last_valid_block_height
+                )
+                .execution_options(synchronize_session=False)
+            ).tuples().all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    # The transfers of one transaction were recorded together and share these values
+    transactions = {}
+    for signature, event_id, sent_at, last_valid_block_height in rows:
+        transactions.setdefault(signature, SentTransaction(signature, event_id, sent_at, last_valid_block_height))
+    return sorted(transactions.values(), key=lambda transaction: transaction.sent_at or datetime.min)
+
+
+def apply_confirmations(outcomes: Dict[str, Optional[str]]):
+    """
+    Move the transfers of settled transactions out of 'sent' in bulk.
+    Each UPDATE only touches rows still marked 'sent' and returns their
+    events, so the counters change by exactly the rows that moved even if
+    another tracker settled some of them first.
+
+    Args:
+        outcomes: {signature: None if confirmed, else the error it failed with}
+    """
+    groups = defaultdict(list)
+    for signature, error in outcomes.items():
+        groups[error].append(signature)
+
+    with app.app_context():
+        now = datetime.utcnow()
+        deltas = defaultdict(Counter)
+        try:
+            for error, signatures in groups.items():
+                status = 'success' if error is None else 'failed'
+                for start in range(0, len(signatures), _UPDATE_CHUNK_SIZE):
+                    event_ids = db.session.execute(
+                        update(AirdropTransaction)
+                        .where(
+                            AirdropTransaction.status == 'sent',
+                            AirdropTransaction.transaction_signature.in_(signatures[start:start + _UPDATE_CHUNK_SIZE])
+                        )
+                        .values(
+                            status=status, error_message=error, completed_at=now,
+                            lease_owner=None, lease_expires_at=None
+                        )
+                        .returning(AirdropTransaction.event_id)
+                        .execution_options(synchronize_session=False)
+                    ).scalars().all()
+                    for event_id in event_ids:
+                        deltas[event_id]['sent'] -= 1
+                        deltas[event_id][status] += 1
+            AirdropEvent.apply_status_deltas(deltas)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        progress.notify(deltas)
+
+
+def claim_for_resign(signature: str, worker_id: str, lease_seconds: int) -> List[tuple]:
+    """
+    Take a lease on the transfers of an expired transaction before re-signing
+    it, so only one worker sends the replacement. The tracker that leased the
+    transaction for polling already holds it.
+
+    Returns:
+        list: (transaction ID, wallet address, resign count) of the claimed transfers
+    """
+    with app.app_context():
+        now = datetime.utcnow()
+        try:
+            claimed = db.session.execute(
+                update(AirdropTransaction)
+                .where(
+                    AirdropTransaction.transaction_signature == signature,
+                    AirdropTransaction.status == 'sent',
+                    _leasable(worker_id, now)
+                )
+                .values(lease_owner=worker_id, lease_expires_at=now + timedelta(seconds=lease_seconds))
+                .returning(AirdropTransaction.id, AirdropTransaction.wallet_address, AirdropTransaction.resign_count)
+                .execution_options(synchronize_session=False)
+            ).tuples().all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    claimed.sort()
+    return claimed
+
+
+class ConfirmationTracker:
+    """
+    Polls the signatures of sent transactions and settles them in bulk.
+    A single timer loop serves every airdrop: each tick leases up to
+    CONFIRMATION_SCAN_LIMIT outstanding signatures not polled by another
+    tracker and looks them up with batched getSignatureStatuses calls.
+    """
+
+    def __init__(self, worker_id: str, poll_interval: Optional[float] = None,
+                 lease_seconds: Optional[int] = None):
+        self.worker_id = worker_id
+        self.poll_interval = poll_interval or config.CONFIRMATION_POLL_SECONDS
+        self.lease_seconds = lease_seconds or config.AIRDROP_LEASE_SECONDS
+        self._contexts: Dict[int, Optional[AirdropContext]] = {}
+        self._stopping = False
+        self._draining = False
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def stop(self):
+        """Stop after the current tick (call from the tracker's event loop)"""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def drain(self):
+        """Stop once no transaction awaits confirmation (call from the tracker's event loop)"""
+        self._draining = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        """Poll outstanding transactions until stopped"""
+        self._wakeup = asyncio.Event()
+        while not self._stopping:
+            try:
+                outstanding = await self.poll()
+            except Exception as e:
+                logger.error(f"Confirmation tracker {self.worker_id} failed to poll: {e}")
+                outstanding = None
+            if self._draining and outstanding == 0:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def poll(self) -> int:
+        """
+        Check one round of outstanding transactions.
+
+        Returns:
+            int: Number of transactions leased for the round
+        """
+        transactions = await asyncio.to_thread(
+            lease_outstanding_transactions, self.worker_id, config.CONFIRMATION_SCAN_LIMIT, self.lease_seconds
+        )
+        if not transactions:
+            return 0
+
+        statuses = await fetch_signature_statuses([transaction.signature for transaction in transactions])
+        outcomes, unknown = _settle(transactions, statuses)
+
+        expired = []
+        if unknown:
+            block_height = None
+            if any(transaction.last_valid_block_height is not None for transaction in unknown):
+                block_height = await fetch_block_height()
+            expired = [transaction for transaction in unknown if _blockhash_expired(transaction, block_height)]
+        if expired:
+            # The recent status cache only covers the last few minutes, so a
+            # transaction that landed before a restart or a slow round reads
+            # as unknown there; only one the ledger history does not know
+            # either can be signed and sent again without paying twice
+            history = await fetch_signature_statuses(
+                [transaction.signature for transaction in expired], search_history=True
+            )
+            landed, expired = _settle(expired, history)
+            outcomes.update(landed)
+
+        if outcomes:
+            await asyncio.to_thread(apply_confirmations, outcomes)
+            logger.info(f"Settled {len(outcomes)} of {len(transactions)} outstanding airdrop transactions")
+
+        for transaction in expired:
+            await self._resign(transaction, block_height)
+
+        return len(transactions)
+
+    async def _resign(self, transaction: SentTransaction, block_height: Optional[int]):
+        """Re-sign and resend an expired transaction with a fresh blockhash"""
+        claimed = await asyncio.to_thread(claim_for_resign, transaction.signature, self.worker_id, self.lease_seconds)
+        if not claimed:
+            return
+
+        # The shared blockhash may still be the one that just expired
+        current = blockhash_cache.peek()
+        if transaction.last_valid_block_height is not None and (
+            current is None or current.last_valid_block_height is None
+            or current.last_valid_block_height <= max(transaction.last_valid_block_height, block_height or 0)
+        ):
+            await blockhash_cache.refresh()
+
+        def resign_rows(result: dict) -> List[dict]:
+            rows = []
+            for transaction_id, _, resign_count in claimed:
+                row = transaction_result_row(transaction_id, result, attempt=False)
+                row["resign_count"] = resign_count + 1
+                rows.append(row)
+            return rows
+
+        saved = False
+
+        async def save_sent(result: dict):
+            # The new signature is recorded before it is sent, like a first send
+            nonlocal saved
+            await asyncio.to_thread(write_transaction_results, resign_rows(result))
+            saved = True
+
+        context = await self._context(transaction.event_id)
+        resigns = max(resign_count for _, _, resign_count in claimed)
+        if context is None:
+            result = {"success": False, "error": f"Airdrop {transaction.event_id} not found"}
+        elif resigns >= config.CONFIRMATION_MAX_RESIGNS:
+            # Worth another attempt later, through the retry backoff (see dispatch.write_transaction_results)
+            result = {"success": False, "error": f"Not confirmed after {resigns + 1} blockhash expiries", "retryable": True}
+        else:
+            wallet_addresses = [wallet_address for _, wallet_address, _ in claimed]
+            try:
+                token_accounts = await asyncio.to_thread(
+                    resolve_token_accounts, wallet_addresses, context.token_mint
+                )
+                await context.prefetch_accounts(list(token_accounts.values()))
+                result = await process_airdrop_batch_transaction(
+                    wallet_addresses=wallet_addresses,
+                    context=context,
+                    token_accounts=[token_accounts[wallet_address] for wallet_address in wallet_addresses],
+                    before_send=save_sent
+                )
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+
+        if result.get("success"):
+            logger.info(f"Re-signed expired transaction {transaction.signature} as {result['signature']}")
+        if not (saved and result.get("success")):
+            await asyncio.to_thread(write_transaction_results, resign_rows(result))
+
+    async def _context(self, event_id: int) -> Optional[AirdropContext]:
+        if event_id not in self._contexts:
+            self._contexts[event_id] = await asyncio.to_thread(load_airdrop_context, event_id)
+        return self._contexts[event_id]
+
+
+def _settle(transactions: List[SentTransaction],
+            statuses: Dict[str, Optional[dict]]) -> Tuple[Dict[str, Optional[str]], List[SentTransaction]]:
+    """
+    Sort looked-up transactions by their status.
+
+    Returns:
+        tuple: Outcomes of the settled ones (see apply_confirmations), and the
+               transactions the cluster does not know; ones whose lookup failed
+               or that are not confirmed yet are in neither
+    """
+    accepted = _CONFIRMED_STATUSES.get(config.CONFIRMATION_COMMITMENT, _CONFIRMED_STATUSES['confirmed'])
+    outcomes = {}
+    unknown = []
+    for transaction in transactions:
+        if transaction.signature not in statuses:
+            continue
+        status = statuses[transaction.signature]
+        if status is None:
+            unknown.append(transaction)
+        elif status.get("err") is not None:
+            outcomes[transaction.signature] = f"Transaction failed: {status['err']}"
+        elif status.get("confirmationStatus") in accepted:
+            outcomes[transaction.signature] = None
+    return outcomes, unknown
+
+
+def _blockhash_expired(transaction: SentTransaction, block_height: Optional[int]) -> bool:
+    """Whether a transaction the cluster does not know can no longer land"""
+    if transaction.last_valid_block_height is not None and block_height is not None:
+        return block_height > transaction.last_valid_block_height
+    if transaction.sent_at is None:
+        return True
+    return datetime.utcnow() - transaction.sent_at > timedelta(seconds=config.BLOCKHASH_TTL_SECONDS)
@@ -0,0 +1,557 @@
+"""
+Airdrop dispatch engine for the Solana Airdrop Bot.
+Shared by the web interface and the Telegram bot to send airdrop transfers
+concurrently, with a bounded number of transactions in flight.
+"""
+import asyncio
+import atexit
+import logging
+import random
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, literal, select, update
+from sqlalchemy.orm import aliased
+
+import config
+from app import app, db
+from models import AirdropEvent, AirdropTransaction, TokenAccount, WalletAddress
+import progress
+from solana_rpc import is_transient_error
+from utils import (
+    AirdropContext,
+    pack_transfers,
+    process_airdrop_batch_transaction,
+    validate_solana_addresses
+)
+
+logger = logging.getLogger(__name__)
+
+# Result writers with unflushed results, flushed on interpreter shutdown
+_active_writers = set()
+
+
+class AirdropDispatcher:
+    """
+    Sends the transfers of an airdrop event concurrently.
+    Recipients are packed into multi-transfer transactions and at most
+    `max_in_flight` transactions are outstanding at any time. RPC requests
+    go through the pooled client (see solana_rpc), which adapts the load on
+    each endpoint to its latency and throttling responses.
+    Results are streamed back into AirdropTransaction as they complete.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None, max_transfers_per_tx: Optional[int] = None):
+        self.max_in_flight = max(1, max_in_flight or config.AIRDROP_MAX_IN_FLIGHT)
+        self.max_transfers_per_tx = max_transfers_per_tx or config.AIRDROP_MAX_TRANSFERS_PER_TX
+
+    async def run(
+        self,
+        event_id: int,
+        recipients: Iterable[Tuple[int, str]],
+        context: AirdropContext
+    ) -> Dict[str, int]:
+        """
+        Dispatch an airdrop to the given wallet addresses.
+
+        Args:
+            event_id: ID of the AirdropEvent being processed
+            recipients: (transaction ID, wallet address) pairs of pending transactions
+            context: Transfer parameters resolved once for the airdrop event
+
+        Returns:
+            dict: Number of sent and failed transfers
+        """
+        logger.info(f"Dispatching airdrop {event_id} with up to {self.max_in_flight} transactions in flight")
+
+        summary = {"sent": 0, "failed": 0}
+        window = asyncio.Semaphore(self.max_in_flight)
+        writer = ResultWriter()
+        writer.start()
+
+        def record(transaction_id: int, result: dict, attempt: bool = True):
+            summary["sent" if result.get("success") else "failed"] += 1
+            writer.add(transaction_id, result, attempt=attempt)
+
+        async def send(group: List[Tuple[int, str]], token_accounts: Dict[str, str]):
+            transaction_ids = [transaction_id for transaction_id, _ in group]
+            saved = False
+
+            async def save_sent(result: dict):
+                # Record the signature before the transaction can land, so a
+                # crash after sending leaves it to the confirmation tracker
+                # instead of sending the transfers again
+                nonlocal saved
+                await writer.save(transaction_ids, result)
+                saved = True
+
+            try:
+                result = await process_airdrop_batch_transaction(
+                    wallet_addresses=[wallet_address for _, wallet_address in group],
+                    context=context,
+                    token_accounts=[token_accounts[wallet_address] for _, wallet_address in group],
+                    before_send=save_sent
+                )
+            except Exception as e:
+                logger.error(f"Error processing airdrop transaction for {len(group)} wallets: {e}")
+                result = {"success": False, "error": str(e), "retryable": is_transient_error(e)}
+            finally:
+                window.release()
+            # A packed transaction succeeds or fails for all of its recipients
+            for transaction_id in transaction_ids:
+                if saved and result.get("success"):
+                    summary["sent"] += 1
+                else:
+                    record(transaction_id, result, attempt=not saved)
+
+        def valid_recipients():
+            # Invalid addresses fail on their own instead of failing a whole transaction
+            chunk = list(recipients)
+            flags = validate_solana_addresses(wallet_address for _, wallet_address in chunk)
+            for (transaction_id, wallet_address), valid in zip(chunk, flags):
+                if valid:
+                    yield transaction_id, wallet_address
+                else:
+                    record(transaction_id, {"success": False, "error": f"Invalid wallet address: {wallet_address}"})
+
+        in_flight = set()
+        try:
+            # Nothing can be sent if the shared parameters are unusable
+            if context.error:
+                for transaction_id, _ in recipients:
+                    record(transaction_id, {"success": False, "error": context.error})
+            else:
+                valid = list(valid_recipients())
+                token_accounts = await asyncio.to_thread(
+                    resolve_token_accounts, [wallet_address for _, wallet_address in valid], context.token_mint
+                )
+                await context.prefetch_accounts(list(token_accounts.values()))
+
+                def needs_create(recipient: Tuple[int, str]) -> bool:
+                    return context.needs_account(token_accounts[recipient[1]])
+
+                for group in pack_transfers(valid, self.max_transfers_per_tx, needs_create):
+                    await window.acquire()
+                    task = asyncio.create_task(send(group, token_accounts))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.gather(*in_flight)
+        finally:
+            await writer.close()
+
+        logger.info(
+            f"Airdrop {event_id} dispatched: {summary['sent']} sent, {summary['failed']} failed"
+        )
+        return summary
+
+
+class ResultWriter:
+    """
+    Write-behind buffer for transfer results.
+    Results are collected in memory and written as one bulk UPDATE every
+    `batch_size` results or `flush_interval_ms` milliseconds, whichever comes
+    first. Each row is updated by primary key with its final values, so
+    retrying a failed flush is idempotent. Results that must be saved before
+    going on (see save) are written with the next flush and awaited.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, flush_interval_ms: Optional[int] = None):
+        self.batch_size = max(1, batch_size or config.AIRDROP_RESULT_BATCH_SIZE)
+        self.flush_interval = (flush_interval_ms or config.AIRDROP_RESULT_FLUSH_MS) / 1000
+        self._buffer: List[dict] = []
+        self._waiting: List[Tuple[List[dict], asyncio.Future]] = []
+        self._lock = threading.Lock()
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def start(self):
+        """Start the periodic flush task on the running event loop"""
+        self._flush_requested = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        _active_writers.add(self)
+
+    def add(self, transaction_id: int, result: dict, attempt: bool = True):
+        """Buffer the result of a transfer"""
+        row = transaction_result_row(transaction_id, result, attempt=attempt)
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def save(self, transaction_ids: List[int], result: dict):
+        """
+        Write the result of a transaction and return once it is committed.
+        Results saved while a flush is running go out together in the next
+        one, so concurrent transactions share a single UPDATE.
+
+        Raises:
+            Exception: The write failed; the result is not kept buffered
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        rows = [transaction_result_row(transaction_id, result) for transaction_id in transaction_ids]
+        with self._lock:
+            self._waiting.append((rows, waiter))
+        self._flush_requested.set()
+        await waiter
+
+    async def flush(self):
+        """Write all buffered results"""
+        rows = self._take()
+        with self._lock:
+            waiting, self._waiting = self._waiting, []
+        if not rows and not waiting:
+            return
+        saved = [row for batch, _ in waiting for row in batch]
+        error = None
+        for attempt in range(1, 4):
+            try:
+                await asyncio.to_thread(write_transaction_results, saved + rows)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                logger.warning(f"Flushing {len(saved) + len(rows)} airdrop results failed (attempt {attempt}): {e}")
+                await asyncio.sleep(0.5 * attempt)
+        for _, waiter in waiting:
+            if not waiter.done():
+                if error is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(error)
+        if error is not None and rows:
+            # Keep the results buffered so the next flush (or shutdown) retries them
+            logger.error(f"Could not flush {len(rows)} airdrop results, keeping them buffered")
+            with self._lock:
+                self._buffer[:0] = rows
+
+    async def close(self):
+        """
+        Stop the flush task and write any remaining results.
+        Does not return until every result is saved: the caller keeps the
+        chunk's leases alive meanwhile, so no other worker can claim and send
+        again transfers whose outcome is still only in memory.
+        """
+        self._closed = True
+        if self._task is not None:
+            self._flush_requested.set()
+            await self._task
+        delay = 1.0
+        while True:
+            await self.flush()
+            with self._lock:
+                if not self._buffer:
+                    break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        _active_writers.discard(self)
+
+    def flush_sync(self):
+        """Write buffered results from synchronous code (used at shutdown)"""
+        rows = self._take()
+        if rows:
+            write_transaction_results(rows)
+
+    def _take(self) -> List[dict]:
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        return rows
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+
+def transaction_result_row(transaction_id: int, result: dict, attempt: bool = True) -> dict:
+    """
+    Build the bulk UPDATE row recording the outcome of sending a transfer.
+    A transfer that was sent waits as 'sent' for the confirmation tracker
+    (see confirmation.py); one that could not be sent fails, unless the
+    failure was transient and it has attempts left (see
+    write_transaction_results). Either way the row's lease is released.
+
+    Args:
+        transaction_id: ID of the AirdropTransaction row
+        result: Result of process_airdrop_batch_transaction
+        attempt: Whether the result counts as a send attempt; re-signing an
+            expired transaction does not
+    """
+    now = datetime.utcnow()
+    sent = bool(result.get('success'))
+    return {
+        "id": transaction_id,
+        "status": 'sent' if sent else 'failed',
+        "transaction_signature": result.get('signature', None),
+        "error_message": result.get('error', None),
+        "sent_at": now if sent else None,
+        "last_valid_block_height": result.get('last_valid_block_height', None),
+        "completed_at": None if sent else now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "retryable": not sent and bool(result.get('retryable')),
+        "attempt": attempt
+    }
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Backoff before sending a transfer again: exponential in the attempts made
+    so far, capped at AIRDROP_RETRY_MAX_SECONDS, with half of it randomized
+    so transfers that failed together do not all come back at once.
+    """
+    delay = min(config.AIRDROP_RETRY_MAX_SECONDS, config.AIRDROP_RETRY_BASE_SECONDS * 2 ** min(attempts - 1, 30))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _count_attempt(row: dict, attempts: int, now: datetime, leased: bool = True) -> dict:
+    """
+    Count the send in a result row, turning a transient failure into a delayed retry.
+    Only rows still leased count an attempt: writing a result releases the
+    lease, so a result written again finds the row released.
+    """
+    row = dict(row)
+    retryable = row.pop("retryable", False)
+    row["attempts"] = attempts + 1 if row.pop("attempt", True) and leased else attempts
+    row["next_attempt_at"] = None
+    if row["status"] == 'failed' and retryable and row["attempts"] < config.AIRDROP_MAX_ATTEMPTS:
+        row["status"] = 'pending'
+        row["completed_at"] = None
+        row["next_attempt_at"] = now + timedelta(seconds=retry_delay(row["attempts"]))
+        if "resign_count" in row:
+            row["resign_count"] = 0
+    return row
+
+
+def write_transaction_results(rows: List[dict]):
+    """
+    Apply buffered transaction results with a single bulk UPDATE by primary key.
+    Each dispatched result counts as an attempt; transient failures with attempts left
+    go back to 'pending' until their backoff has passed. The event counters
+    are adjusted in the same database transaction from the statuses the rows
+    actually had, so they stay exact if a failed write is retried. A write
+    that did commit but reported an error is harmless to retry as well:
+    results for rows already released that would leave their status as it
+    is are skipped, so neither the rows nor the counters change twice.
+    """
+    with app.app_context():
+        try:
+            previous = select(
+                AirdropTransaction.id, AirdropTransaction.event_id, AirdropTransaction.status,
+                AirdropTransaction.attempts, AirdropTransaction.lease_owner
+            ).where(AirdropTransaction.id.in_([row["id"] for row in rows]))
+            if db.engine.dialect.name == 'postgresql':
+                previous = previous.with_for_update()
+            previous = {
+                id_: (event_id, status, attempts or 0, lease_owner is not None)
+                for id_, event_id, status, attempts, lease_owner in db.session.execute(previous)
+            }
+
+            now = datetime.utcnow()
+            counted = []
+            for row in rows:
+                if row["id"] not in previous:
+                    counted.append(_count_attempt(row, 0, now))
+                    continue
+                _, status, attempts, leased = previous[row["id"]]
+                row = _count_attempt(row, attempts, now, leased)
+                if leased or row["status"] != status:
+                    counted.append(row)
+            rows = counted
+            if rows:
+                db.session.execute(update(AirdropTransaction), rows)
+
+            deltas = defaultdict(Counter)
+            for row in rows:
+                if row["id"] not in previous:
+                    continue
+                event_id, old_status, _, _ = previous[row["id"]]
+                if old_status != row["status"]:
+                    deltas[event_id][old_status] -= 1
+                    deltas[event_id][row["status"]] += 1
+            AirdropEvent.apply_status_deltas(deltas)
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # Push the new counters to admins watching these airdrops
+        progress.notify(deltas)
+
+
+@atexit.register
+def _flush_active_writers():
+    """Make sure buffered results are not lost when the process exits"""
+    for writer in list(_active_writers):
+        try:
+            writer.flush_sync()
+        except Exception as e:
+            logger.error(f"Error flushing airdrop results at shutdown: {e}")
+
+
+def load_airdrop_context(event_id: int) -> Optional[AirdropContext]:
+    """Load the transfer parameters of an airdrop event and resolve them"""
+    with app.app_context():
+        event = db.session.get(AirdropEvent, event_id)
+        if event is None:
+            return None
+        return AirdropContext(
+            token_mint=event.token_mint or config.SPL_TOKEN_MINT,
+            token_amount=float(event.token_amount),
+            token_decimals=int(event.token_decimals or 0),
+            sender_secret_key=config.SENDER_SECRET_KEY
+        )
+
+
+def resolve_token_accounts(wallet_addresses: List[str], token_mint: str) -> Dict[str, str]:
+    """Look up or derive the associated token accounts of recipients (thread target)"""
+    with app.app_context():
+        return TokenAccount.resolve(wallet_addresses, token_mint)
+
+
+def recipient_addresses(token_mint: Optional[str] = None, exclude_paid: bool = False):
+    """
+    Build the eligibility set of an airdrop as a SELECT to snapshot from.
+    Each validated address is eligible once, however many users registered
+    it. Addresses already paid this token by an earlier airdrop (or with a
+    transfer still awaiting confirmation) can be left out; that exclusion is
+    a single NOT EXISTS anti-join, not a lookup per address.
+
+    Args:
+        token_mint: SPL token mint address of the airdrop
+        exclude_paid: Skip addresses with a sent or successful transfer of the same mint
+
+    Returns:
+        Select: Distinct eligible addresses
+    """
+    addresses = select(WalletAddress.address).where(WalletAddress.is_validated.is_(True))
+    if exclude_paid and token_mint:
+        paid = (
+            select(AirdropTransaction.id)
+            .join(AirdropEvent, AirdropEvent.id == AirdropTransaction.event_id)
+            .where(
+                AirdropTransaction.wallet_address == WalletAddress.address,
+                AirdropTransaction.status.in_(('sent', 'success')),
+                AirdropEvent.token_mint == token_mint
+            )
+        )
+        addresses = addresses.where(~paid.exists())
+    return addresses.distinct()
+
+
+def retry_failed_transactions(event_id: int) -> int:
+    """
+    Put the failed transfers of an airdrop back in the job queue.
+    Only rows of this event that are currently 'failed' are touched, with a
+    fresh attempt budget; wallets paid the same token in the meantime (by
+    another airdrop) stay failed. Must be called inside an application
+    context.
+
+    Args:
+        event_id: ID of the AirdropEvent to retry
+
+    Returns:
+        int: Number of transfers queued again
+    """
+    event = db.session.get(AirdropEvent, event_id)
+    if event is None:
+        return 0
+
+    other = aliased(AirdropTransaction)
+    paid = (
+        select(other.id)
+        .join(AirdropEvent, AirdropEvent.id == other.event_id)
+        .where(
+            other.wallet_address == AirdropTransaction.wallet_address,
+            other.status.in_(('sent', 'success')),
+            AirdropEvent.token_mint == event.token_mint
+        )
+    )
+
+    try:
+        count = len(db.session.execute(
+            update(AirdropTransaction)
+            .where(
+                AirdropTransaction.event_id == event_id,
+                AirdropTransaction.status == 'failed',
+                ~paid.exists()
+            )
+            .values(
+                status='pending',
+                attempts=0,
+                next_attempt_at=None,
+                resign_count=0,
+                error_message=None,
+                completed_at=None,
+                lease_owner=None,
+                lease_expires_at=None
+            )
+            .returning(AirdropTransaction.id)
+            .execution_options(synchronize_session=False)
+        ).all())
+        AirdropEvent.apply_status_deltas({event_id: {'failed': -count, 'pending': count}})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    progress.notify([event_id])
+    logger.info(f"Queued {count} failed transfers of airdrop {event_id} for retry")
+    return count
+
+
+def snapshot_recipients(event_id: int, addresses=None) -> int:
+    """
+    Freeze the recipient set of an airdrop into pending transaction rows.
+    A single INSERT ... SELECT copies the addresses on the database server,
+    so no wallet rows are loaded into the application however many are
+    registered. Dispatch workers then stream the rows back in claimed chunks.
+    Must be called inside an application context.
+
+    Args:
+        event_id: ID of the AirdropEvent being started
+        addresses: SELECT of distinct recipient addresses (defaults to recipient_addresses())
+
+    Returns:
+        int: Number of recipients in the snapshot
+    """
+    addresses = (addresses if addresses is not None else recipient_addresses()).subquery()
+    rows = select(
+        literal(event_id),
+        addresses.c.address,
+        literal('pending'),
+        literal(datetime.utcnow())
+    )
+
+    try:
+        result = db.session.execute(
+            insert(AirdropTransaction).from_select(
+                ["event_id", "wallet_address", "status", "created_at"], rows
+            )
+        )
+        count = result.rowcount
+        db.session.execute(
+            update(AirdropEvent)
+            .where(AirdropEvent.id == event_id)
+            .values(
+                total_count=AirdropEvent.total_count + count,
+                pending_count=AirdropEvent.pending_count + count
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Snapshotted {count} recipients for airdrop {event_id}")
+    return count
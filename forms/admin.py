@@ -31,6 +31,7 @@ class AirdropForm(FlaskForm):
     amount = FloatField('Amount Per Wallet', validators=[DataRequired(), NumberRange(min=0)])
     decimals = IntegerField('Token Decimals', validators=[DataRequired(), NumberRange(min=0, max=9)])
     message = TextAreaField('Airdrop Message (Optional)', validators=[Optional(), Length(max=500)])
+    exclude_paid = BooleanField('Skip wallets already paid this token')
     submit = SubmitField('Start Airdrop')
     
     def validate_token_mint(self, token_mint):
@@ -43,17 +43,19 @@ routes.register_routes(app)
 def start_telegram_bot():
     """Start the Telegram bot in a separate thread"""
     logger.info("Starting Telegram bot...")
-    # Create telegram bot instance
-    telegram_bot = bot.TelegramBot(token=config.BOT_TOKEN)
-    bot.telegram_bot = telegram_bot
-    # Start the bot
-    telegram_bot.start()
+    # Create and start the bot instance
+    bot.start_bot()
 
 def main():
     """
     Main entry point for the application.
     Starts the Flask web server and the Telegram bot (if configured).
     """
+    # Start the airdrop worker, resuming any airdrops interrupted by a restart
+    if config.AIRDROP_WORKER_ENABLED:
+        import worker
+        worker.start_worker()
+    
     # Start the Telegram bot if configured
     if config.BOT_TOKEN:
         telegram_thread = threading.Thread(target=start_telegram_bot)
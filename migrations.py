@@ -0,0 +1,190 @@
+"""
+Schema upgrades for existing Solana Airdrop Bot databases.
+db.create_all() only creates missing tables, so columns and indexes added to
+existing models are brought in here on both SQLite and PostgreSQL.
+Columns are added when the application starts. Indexes can take a long time
+to build on large tables, so they are built by an explicit step instead.
+
+Build missing indexes with: python migrations.py
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def _backfill_event_counters(connection):
+    """Compute the materialized transaction counters of existing airdrop events"""
+    from models import AirdropEvent
+    counts = {}
+    rows = connection.execute(text(
+        "SELECT event_id, status, COUNT(*) FROM airdrop_transaction GROUP BY event_id, status"
+    ))
+    for event_id, status, count in rows:
+        counts.setdefault(event_id, {})[status] = count
+    for event_id, statuses in counts.items():
+        values = {column: statuses.get(status, 0) for status, column in AirdropEvent.STATUS_COUNTERS.items()}
+        values['total_count'] = sum(statuses.values())
+        connection.execute(
+            AirdropEvent.__table__.update().where(AirdropEvent.__table__.c.id == event_id).values(**values)
+        )
+
+
+# Serializes schema upgrades of concurrently starting processes on PostgreSQL
+_UPGRADE_LOCK_ID = 0x41495244
+
+# Data migrations run once after the column that triggers them has been added
+BACKFILLS = {
+    ("airdrop_event", "total_count"): _backfill_event_counters,
+}
+
+# Indexes made redundant by a composite index with the same leading column
+REDUNDANT_INDEXES = {
+    "airdrop_transaction": ["ix_airdrop_transaction_event_id"],
+}
+
+
+def _column_ddl(column, dialect) -> str:
+    """Build the column definition used by ALTER TABLE ... ADD COLUMN"""
+    preparer = dialect.identifier_preparer
+    ddl = f"{preparer.format_column(column)} {column.type.compile(dialect=dialect)}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        default = default.text if hasattr(default, "text") else f"'{default}'"
+        ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def upgrade_schema():
+    """
+    Add model columns that are missing from existing tables.
+    Every web and worker process runs this at start-up. On PostgreSQL the
+    upgrade holds an advisory lock, so concurrent processes take turns and
+    later ones find the columns in place. SQLite serializes the writes itself,
+    and a column another process added in the meantime is skipped.
+    Missing indexes are only reported; see build_indexes.
+    Must be called inside an application context, after db.create_all().
+    """
+    engine = db.engine
+    postgres = engine.dialect.name == 'postgresql'
+    preparer = engine.dialect.identifier_preparer
+
+    added = []
+    with engine.begin() as connection:
+        if postgres:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _UPGRADE_LOCK_ID})
+        inspector = inspect(connection)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                logger.info(f"Adding column {table.name}.{column.name}")
+                add_column = "ADD COLUMN IF NOT EXISTS" if postgres else "ADD COLUMN"
+                try:
+                    connection.execute(text(
+                        f"ALTER TABLE {preparer.format_table(table)} {add_column} "
+                        f"{_column_ddl(column, engine.dialect)}"
+                    ))
+                except OperationalError as e:
+                    if "duplicate column" not in str(e).lower():
+                        raise
+                    logger.info(f"Column {table.name}.{column.name} was added by another process")
+                    continue
+                added.append((table.name, column.name))
+
+        for key in added:
+            if key in BACKFILLS:
+                logger.info(f"Backfilling data for {key[0]}.{key[1]}")
+                BACKFILLS[key](connection)
+
+    missing = [index.name for _, index in _missing_indexes(engine)]
+    if missing:
+        logger.warning(f"Database indexes missing or invalid: {', '.join(missing)}. Run: python migrations.py")
+
+
+def _invalid_indexes(engine) -> set:
+    """Names of indexes a failed CREATE INDEX CONCURRENTLY left behind unusable (PostgreSQL only)"""
+    if engine.dialect.name != 'postgresql':
+        return set()
+    with engine.connect() as connection:
+        return set(connection.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+        )).scalars())
+
+
+def _missing_indexes(engine) -> list:
+    """(table, index) pairs of model indexes that are absent or invalid"""
+    inspector = inspect(engine)
+    invalid = _invalid_indexes(engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)} - invalid
+        missing.extend((table, index) for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def build_indexes():
+    """
+    Create model indexes missing from existing tables and drop redundant ones.
+    PostgreSQL builds them CONCURRENTLY so large tables stay writable while
+    the index is built; that cannot run inside a transaction, so each index
+    is created on an autocommit connection. An index left invalid by an
+    interrupted build is dropped and built again.
+    Must be called inside an application context.
+    """
+    engine = db.engine
+    postgres = engine.dialect.name == 'postgresql'
+    preparer = engine.dialect.identifier_preparer
+    invalid = _invalid_indexes(engine)
+
+    for table, index in _missing_indexes(engine):
+        name = preparer.quote(index.name)
+        ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+        if postgres:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                if index.name in invalid:
+                    logger.info(f"Dropping invalid index {index.name}")
+                    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                logger.info(f"Creating index {index.name} on {table.name}")
+                connection.execute(text(ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY IF NOT EXISTS", 1)))
+        else:
+            logger.info(f"Creating index {index.name} on {table.name}")
+            with engine.begin() as connection:
+                connection.execute(text(ddl.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1)))
+
+    inspector = inspect(engine)
+    for table_name, names in REDUNDANT_INDEXES.items():
+        if not inspector.has_table(table_name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table_name)}
+        for index_name in names:
+            if index_name not in existing:
+                continue
+            logger.info(f"Dropping redundant index {index_name}")
+            name = preparer.quote(index_name)
+            if postgres:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            else:
+                with engine.begin() as connection:
+                    connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+if __name__ == "__main__":
+    from app import app
+
+    logging.basicConfig(level=logging.INFO)
+    with app.app_context():
+        build_indexes()
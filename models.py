@@ -5,7 +5,7 @@ from datetime import datetime
 from app import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from utils import validate_solana_address, format_solana_address
+from utils import validate_solana_address, format_solana_address, derive_token_addresses
 
 class User(UserMixin, db.Model):
     """User model for authentication and admin management"""
@@ -33,9 +33,14 @@ class User(UserMixin, db.Model):
 
 class WalletAddress(db.Model):
     """Solana wallet address model"""
+    __table_args__ = (
+        # Duplicate checks on registration and lookups by address
+        db.Index('ix_wallet_address_address_user_id', 'address', 'user_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     address = db.Column(db.String(44), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     label = db.Column(db.String(64), nullable=True)
     is_validated = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -65,39 +70,211 @@ class AirdropEvent(db.Model):
     token_amount = db.Column(db.Float, nullable=False)
     token_decimals = db.Column(db.Integer, default=0)
     started_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # Materialized transaction counters, updated in the same database
+    # transaction as the status changes they count
+    total_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    pending_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    sent_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    success_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    failure_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Counter column for each transaction status
+    STATUS_COUNTERS = {
+        'pending': 'pending_count',
+        'sent': 'sent_count',
+        'success': 'success_count',
+        'failed': 'failure_count',
+    }
     
     # Relationship with transaction records
     transactions = db.relationship('AirdropTransaction', backref='event', lazy=True)
     
     @property
-    def success_count(self):
-        """Count successful transactions"""
-        return sum(1 for tx in self.transactions if tx.status == 'success')
+    def completed_count(self):
+        """Count transactions that are no longer pending or awaiting confirmation"""
+        return self.total_count - self.pending_count - self.sent_count
     
-    @property
-    def failure_count(self):
-        """Count failed transactions"""
-        return sum(1 for tx in self.transactions if tx.status == 'failed')
+    @classmethod
+    def count_statuses(cls, event_ids):
+        """
+        Count transactions by status from the raw transaction rows.
+        Uses a single COUNT(*) ... GROUP BY event_id, status query.
+        
+        Returns:
+            dict: {event_id: {status: count}}
+        """
+        counts = {event_id: {} for event_id in event_ids}
+        if counts:
+            rows = db.session.query(
+                AirdropTransaction.event_id,
+                AirdropTransaction.status,
+                db.func.count()
+            ).filter(
+                AirdropTransaction.event_id.in_(list(counts))
+            ).group_by(
+                AirdropTransaction.event_id,
+                AirdropTransaction.status
+            )
+            for event_id, status, count in rows:
+                counts[event_id][status] = count
+        return counts
     
-    @property
-    def pending_count(self):
-        """Count pending transactions"""
-        return sum(1 for tx in self.transactions if tx.status == 'pending')
+    @classmethod
+    def apply_status_deltas(cls, deltas):
+        """
+        Adjust the counters of several events without reading them first.
+        Must run in the same database transaction as the status changes.
+        
+        Args:
+            deltas: {event_id: {status: change in number of transactions}}
+        """
+        for event_id, changes in deltas.items():
+            values = {}
+            for status, delta in changes.items():
+                column = cls.STATUS_COUNTERS.get(status)
+                if column and delta:
+                    values[column] = getattr(cls, column) + delta
+            if values:
+                db.session.execute(
+                    db.update(cls).where(cls.id == event_id).values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+    
+    def rebuild_counters(self) -> bool:
+        """
+        Recompute the counters from the raw transaction rows.
+        
+        Returns:
+            bool: True if the stored counters were already consistent
+        """
+        counts = AirdropEvent.count_statuses([self.id])[self.id]
+        expected = {'total_count': sum(counts.values())}
+        for status, column in self.STATUS_COUNTERS.items():
+            expected[column] = counts.get(status, 0)
+        
+        consistent = all(getattr(self, column) == value for column, value in expected.items())
+        if not consistent:
+            for column, value in expected.items():
+                setattr(self, column, value)
+        return consistent
         
     def __repr__(self):
         return f'<AirdropEvent {self.id} - {self.token_mint}>'
 
 class AirdropTransaction(db.Model):
     """Model for tracking individual airdrop transactions"""
+    __table_args__ = (
+        # Per-event status counts and job queue claims within an event
+        db.Index('ix_airdrop_transaction_event_id_status', 'event_id', 'status'),
+        # Job queue scan for the oldest pending transaction
+        db.Index('ix_airdrop_transaction_status_id', 'status', 'id'),
+        # Eligibility anti-join against addresses already paid
+        db.Index('ix_airdrop_transaction_wallet_address_status', 'wallet_address', 'status'),
+        # Confirmation updates of all transfers sharing a transaction
+        db.Index('ix_airdrop_transaction_transaction_signature', 'transaction_signature'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey('airdrop_event.id'), nullable=False)
     wallet_address = db.Column(db.String(44), nullable=False)
     transaction_signature = db.Column(db.String(90), nullable=True)
-    status = db.Column(db.String(20), default='pending')  # pending, success, failed
+    status = db.Column(db.String(20), default='pending')  # pending, sent, success (confirmed), failed
     error_message = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     
+    # Submission of a sent transaction awaiting confirmation; it is re-signed
+    # if it has not landed by the time its blockhash expires
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_valid_block_height = db.Column(db.BigInteger, nullable=True)
+    resign_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Sends so far; a transient failure is sent again after a backoff, not
+    # before next_attempt_at
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    
+    # Job queue lease held by the worker currently sending this transaction
+    lease_owner = db.Column(db.String(64), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    
     def __repr__(self):
         return f'<AirdropTransaction {self.status} - {self.wallet_address}>'
+
+class TokenAccount(db.Model):
+    """Derived associated token account of a wallet for a token mint"""
+    __table_args__ = (
+        db.UniqueConstraint('token_mint', 'wallet_address', name='uq_token_account_token_mint_wallet_address'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    wallet_address = db.Column(db.String(44), nullable=False)
+    token_mint = db.Column(db.String(44), nullable=False)
+    address = db.Column(db.String(44), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Wallets looked up per IN (...) query
+    LOOKUP_CHUNK_SIZE = 1000
+    
+    @classmethod
+    def resolve(cls, wallet_addresses, token_mint):
+        """
+        Map wallets to their associated token accounts for a mint.
+        Known accounts are read from the table; only the missing ones are
+        derived (see utils.derive_token_addresses) and stored, so repeat
+        airdrops of the same mint skip derivation entirely.
+        Must be called inside an application context; commits new rows.
+        
+        Args:
+            wallet_addresses: Validated wallet addresses
+            token_mint: Token mint address
+            
+        Returns:
+            dict: {wallet_address: token_account_address}
+        """
+        wallets = list(dict.fromkeys(wallet_addresses))
+        accounts = {}
+        for start in range(0, len(wallets), cls.LOOKUP_CHUNK_SIZE):
+            accounts.update(
+                db.session.query(cls.wallet_address, cls.address).filter(
+                    cls.token_mint == token_mint,
+                    cls.wallet_address.in_(wallets[start:start + cls.LOOKUP_CHUNK_SIZE])
+                )
+            )
+        
+        missing = [wallet for wallet in wallets if wallet not in accounts]
+        if missing:
+            derived = dict(zip(missing, derive_token_addresses(missing, token_mint)))
+            now = datetime.utcnow()
+            rows = [
+                {'wallet_address': wallet, 'token_mint': token_mint, 'address': address, 'created_at': now}
+                for wallet, address in derived.items()
+            ]
+            
+            # Another worker may store the same accounts concurrently
+            dialect = db.engine.dialect.name
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            elif dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                insert = None
+            if insert is not None:
+                statement = insert(cls).on_conflict_do_nothing(index_elements=['token_mint', 'wallet_address'])
+            else:
+                statement = db.insert(cls)
+            
+            try:
+                db.session.execute(statement, rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            accounts.update(derived)
+        
+        return accounts
+    
+    def __repr__(self):
+        return f'<TokenAccount {self.wallet_address} - {self.token_mint}>'
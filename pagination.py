@@ -0,0 +1,95 @@
+"""
+Keyset (cursor) pagination for the Solana Airdrop Bot admin pages.
+Pages are located by the sort key of the last row shown instead of an
+OFFSET, so every page is one index range scan no matter how deep it is.
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+from typing import Callable, Optional, Sequence
+
+from sqlalchemy import DateTime, tuple_
+
+import config
+
+Page = namedtuple("Page", ["items", "next_cursor", "prev_cursor"])
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode the sort key of a row as an opaque URL-safe cursor"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], columns: Sequence) -> Optional[tuple]:
+    """
+    Decode a cursor produced by encode_cursor for the given sort columns.
+
+    Returns:
+        tuple: The sort key values, or None if the cursor is missing or malformed
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(values) != len(columns):
+            return None
+        return tuple(
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        )
+    except (ValueError, TypeError):
+        return None
+
+
+def paginate(query, columns: Sequence, key: Callable, descending: bool = False,
+             after: Optional[str] = None, before: Optional[str] = None,
+             per_page: Optional[int] = None) -> Page:
+    """
+    Fetch one page of a query ordered by a unique sort key.
+
+    Args:
+        query: ORM query to paginate (without ORDER BY or LIMIT)
+        columns: Columns forming the sort key; the last one must be unique (e.g. the ID)
+        key: Function returning the sort key values of a result row
+        descending: Sort newest/highest first
+        after: Cursor of the last row of the previous page (next page)
+        before: Cursor of the first row of the following page (previous page)
+        per_page: Number of rows per page
+
+    Returns:
+        Page: The rows and the cursors of the neighbouring pages (None at either end)
+    """
+    per_page = per_page or config.ADMIN_PAGE_SIZE
+    sort_key = tuple_(*columns) if len(columns) > 1 else columns[0]
+
+    def bound(values):
+        return tuple_(*values) if len(columns) > 1 else values[0]
+
+    after_key = decode_cursor(after, columns)
+    before_key = decode_cursor(before, columns) if after_key is None else None
+
+    # Walking backwards reverses the sort, then the page is flipped back
+    backwards = before_key is not None
+    if after_key is not None:
+        query = query.filter(sort_key < bound(after_key) if descending else sort_key > bound(after_key))
+    elif backwards:
+        query = query.filter(sort_key > bound(before_key) if descending else sort_key < bound(before_key))
+
+    ascending = descending == backwards
+    query = query.order_by(*[column.asc() if ascending else column.desc() for column in columns])
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        next_cursor = encode_cursor(key(rows[-1])) if rows else before
+        prev_cursor = encode_cursor(key(rows[0])) if rows and has_more else None
+    else:
+        next_cursor = encode_cursor(key(rows[-1])) if rows and has_more else None
+        prev_cursor = encode_cursor(key(rows[0])) if rows and after_key is not None else None
+
+    return Page(rows, next_cursor, prev_cursor)
@@ -84,7 +84,9 @@ ADMIN_ONLY = """
 AIRDROP_USAGE = """
 Admin command format:
 
-/airdrop <token_mint_address> <amount> <decimals>
+/airdrop <token_mint_address> <amount> <decimals> [new]
+
+Add "new" to skip wallets already paid this token by a previous airdrop.
 
 Example: /airdrop 7d7jZLzHHefeSDqJj9EJhTrA1Ujmsb3saxs5vPdtpump 10 0
 """
@@ -101,6 +103,10 @@ AIRDROP_NO_WALLETS = """
 ❌ No wallets registered for airdrop.
 """
 
+AIRDROP_NO_ELIGIBLE = """
+❌ No eligible wallets for this airdrop.
+"""
+
 AIRDROP_STARTED = """
 ✅ Started airdrop of {} tokens to {} wallets.
 Processing in background...
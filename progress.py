@@ -0,0 +1,182 @@
+"""
+Live airdrop progress publishing for the Solana Airdrop Bot.
+Each airdrop event being watched has one publisher that fans progress
+snapshots out to every subscribed admin browser (see the server-sent
+events endpoint in routes.py).
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+
+import config
+from app import db
+from models import AirdropEvent
+
+logger = logging.getLogger(__name__)
+
+_publishers: Dict[int, "ProgressPublisher"] = {}
+_publishers_lock = threading.Lock()
+
+# Progress streams open in this process (see open_stream)
+_open_streams = 0
+
+
+def progress_snapshot(event_id: int, total: int, pending: int, sent: int, success: int, failed: int) -> dict:
+    """Build the progress payload shared by the status API and the event stream"""
+    completed = total - pending - sent
+    return {
+        'airdrop_id': event_id,
+        'total': total,
+        'completed': completed,
+        'sent': sent,
+        'success': success,
+        'failed': failed,
+        'status': 'completed' if completed == total else 'in_progress',
+        'progress_percentage': (completed / total * 100) if total > 0 else 0
+    }
+
+
+def read_progress(event_id: int) -> Optional[dict]:
+    """
+    Read the progress of an event from its counter columns.
+    Uses its own connection so long-lived streams never hold a session open.
+    """
+    with db.engine.connect() as connection:
+        row = connection.execute(
+            select(
+                AirdropEvent.total_count,
+                AirdropEvent.pending_count,
+                AirdropEvent.sent_count,
+                AirdropEvent.success_count,
+                AirdropEvent.failure_count
+            ).where(AirdropEvent.id == event_id)
+        ).first()
+    if row is None:
+        return None
+    return progress_snapshot(event_id, *row)
+
+
+class ProgressPublisher:
+    """Fans the progress of one airdrop event out to its subscribers"""
+
+    def __init__(self, event_id: int):
+        self.event_id = event_id
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._last: Optional[dict] = None
+        self._last_refresh = 0.0
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self) -> queue.Queue:
+        """Register a subscriber and return the queue its updates arrive on"""
+        subscription = queue.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: queue.Queue):
+        """Remove a subscriber, dropping the publisher once nobody listens"""
+        with _publishers_lock:
+            with self._lock:
+                self._subscribers.discard(subscription)
+                empty = not self._subscribers
+            if empty and _publishers.get(self.event_id) is self:
+                del _publishers[self.event_id]
+
+    def publish(self, snapshot: dict):
+        """Send a snapshot to all subscribers if it differs from the last one"""
+        with self._lock:
+            if snapshot == self._last:
+                return
+            self._last = snapshot
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            # Subscribers only need the latest snapshot, so replace any unread one
+            try:
+                subscription.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                subscription.put_nowait(snapshot)
+            except queue.Full:
+                pass
+
+    def refresh(self):
+        """
+        Re-read the event counters, at most once per refresh interval however
+        many subscribers ask. Picks up progress made by worker processes that
+        cannot publish to this one directly.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_refresh < config.AIRDROP_PROGRESS_REFRESH_SECONDS:
+                return
+            self._last_refresh = now
+        snapshot = read_progress(self.event_id)
+        if snapshot is not None:
+            self.publish(snapshot)
+
+
+def open_stream() -> bool:
+    """
+    Reserve a progress stream slot in this process.
+    A stream occupies its request worker until the airdrop completes or the
+    browser goes away, so at most AIRDROP_PROGRESS_MAX_STREAMS are served at
+    once and further viewers poll the status API instead.
+
+    Returns:
+        bool: Whether a slot was free; release it with close_stream()
+    """
+    global _open_streams
+    with _publishers_lock:
+        if _open_streams >= config.AIRDROP_PROGRESS_MAX_STREAMS:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_stream():
+    """Release a slot taken by open_stream()"""
+    global _open_streams
+    with _publishers_lock:
+        _open_streams = max(0, _open_streams - 1)
+
+
+def subscribe(event_id: int):
+    """
+    Subscribe to the progress of an airdrop event.
+
+    Returns:
+        tuple: The event's publisher and the subscriber's update queue
+    """
+    with _publishers_lock:
+        publisher = _publishers.get(event_id)
+        if publisher is None:
+            publisher = ProgressPublisher(event_id)
+            _publishers[event_id] = publisher
+        return publisher, publisher.subscribe()
+
+
+def notify(event_ids: Iterable[int]):
+    """
+    Publish fresh progress for events whose transactions just changed.
+    Events nobody is watching are skipped without touching the database.
+    Must be called inside an application context.
+    """
+    for event_id in event_ids:
+        publisher = _publishers.get(event_id)
+        if publisher is None or not publisher.has_subscribers:
+            continue
+        try:
+            snapshot = read_progress(event_id)
+            if snapshot is not None:
+                publisher.publish(snapshot)
+        except Exception as e:
+            logger.warning(f"Could not publish progress of airdrop {event_id}: {e}")
@@ -1,13 +1,19 @@
 """
 Route definitions for the Solana Airdrop Bot web interface
 """
+import hmac
 import os
 import uuid
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
+from sqlalchemy import case, func
 from models import User, WalletAddress, AirdropEvent, AirdropTransaction
-from app import db
+from app import csrf, db
+from bot import WEBHOOK_PATH, start_bot, webhook_secret_token
+from pagination import paginate
+from solana_rpc import endpoint_stats
+from utils import address_cache_stats
 import logging
 import config
 from datetime import datetime
@@ -245,41 +251,61 @@ def register_routes(app):
                 safe_amount = amount if amount is not None else config.SPL_TOKEN_AMOUNT
                 safe_decimals = decimals if decimals is not None else config.SPL_TOKEN_DECIMALS
 
+                recorded = []
+                
+                async def record_sent(result):
+                    # Record the event and its transfer together, as 'sent', before
+                    # the transaction goes out; the confirmation tracker settles it
+                    airdrop = AirdropEvent(
+                        token_mint=token_mint,
+                        token_amount=amount,
+                        token_decimals=decimals,
+                        started_by=current_user.id,
+                        total_count=1,
+                        sent_count=1
+                    )
+                    db.session.add(airdrop)
+                    try:
+                        db.session.flush()
+                        transaction = AirdropTransaction(
+                            event_id=airdrop.id,
+                            wallet_address=wallet.address,
+                            transaction_signature=result['signature'],
+                            status='sent',
+                            attempts=1,
+                            sent_at=datetime.utcnow(),
+                            last_valid_block_height=result.get('last_valid_block_height')
+                        )
+                        db.session.add(transaction)
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        raise
+                    recorded.append(transaction)
+                
                 # Run the async transaction in the synchronous Flask context
                 result = asyncio.run(process_airdrop_transaction(
                     wallet_address=wallet.address,
                     token_mint=safe_token_mint,
                     token_amount=float(safe_amount),
                     token_decimals=int(safe_decimals),
-                    sender_secret_key=sender_key
+                    sender_secret_key=sender_key,
+                    before_send=record_sent
                 ))
                 
                 if result['success']:
-                    # Create a record of the transaction
-                    airdrop = AirdropEvent(
-                        token_mint=token_mint,
-                        token_amount=amount,
-                        token_decimals=decimals,
-                        started_by=current_user.id
-                    )
-                    db.session.add(airdrop)
-                    db.session.commit()
-                    
-                    # Create transaction record
-                    transaction = AirdropTransaction(
-                        event_id=airdrop.id,
-                        wallet_address=wallet.address,
-                        transaction_signature=result['signature'],
-                        status='success',
-                        completed_at=datetime.utcnow()
-                    )
-                    db.session.add(transaction)
-                    db.session.commit()
-                    
-                    flash(f'Successfully sent {amount} tokens to your wallet!', 'success')
+                    flash(f'Sent {amount} tokens to your wallet! The transfer is awaiting confirmation.', 'success')
                     return redirect(url_for('wallets'))
-                else:
-                    flash(f'Failed to send tokens: {result["error"]}', 'danger')
+                
+                if recorded:
+                    # Recorded, but the send itself failed
+                    transaction = recorded[0]
+                    transaction.status = 'failed'
+                    transaction.error_message = result['error']
+                    transaction.completed_at = datetime.utcnow()
+                    AirdropEvent.apply_status_deltas({transaction.event_id: {'sent': -1, 'failed': 1}})
+                    db.session.commit()
+                flash(f'Failed to send tokens: {result["error"]}', 'danger')
             except Exception as e:
                 flash(f'Error sending tokens: {str(e)}', 'danger')
                 logger.exception("Error sending tokens")
@@ -313,8 +339,32 @@ def register_routes(app):
                 
                 return redirect(url_for('admin_users'))
         
-        users = User.query.all()
-        return render_template('admin/users.html', users=users)
+        page = paginate(
+            User.query, [User.id], key=lambda user: (user.id,),
+            after=request.args.get('after'), before=request.args.get('before')
+        )
+        
+        # Wallet counts for the whole page in one grouped query instead of one per user
+        wallet_counts = dict(
+            db.session.query(WalletAddress.user_id, func.count(WalletAddress.id))
+            .filter(WalletAddress.user_id.in_([user.id for user in page.items]))
+            .group_by(WalletAddress.user_id)
+            .all()
+        )
+        
+        total_users, admin_users, telegram_users = db.session.query(
+            func.count(User.id),
+            func.coalesce(func.sum(case((User.is_admin.is_(True), 1), else_=0)), 0),
+            func.count(User.telegram_id)
+        ).one()
+        user_stats = {
+            'total': total_users,
+            'admins': admin_users,
+            'telegram': telegram_users
+        }
+        
+        return render_template('admin/users.html', users=page.items, page=page,
+                               wallet_counts=wallet_counts, user_stats=user_stats)
     
     @app.route('/admin/airdrops', methods=['GET', 'POST'])
     @login_required
@@ -330,16 +380,15 @@ def register_routes(app):
             amount = float(request.form.get('amount', config.SPL_TOKEN_AMOUNT))
             decimals = int(request.form.get('decimals', config.SPL_TOKEN_DECIMALS))
             message = request.form.get('message', '')
+            exclude_paid = bool(request.form.get('exclude_paid'))
             
             # Validate sender wallet is configured
             if not config.SENDER_SECRET_KEY:
                 flash('Sender wallet not configured. Cannot start airdrop.', 'danger')
                 return redirect(url_for('admin_airdrops'))
             
-            # Get all registered wallets
-            wallets = WalletAddress.query.all()
-            
-            if not wallets:
+            # Check that there is anyone to airdrop to
+            if db.session.query(WalletAddress.id).first() is None:
                 flash('No wallets registered for airdrop.', 'warning')
                 return redirect(url_for('admin_airdrops'))
             
@@ -353,71 +402,82 @@ def register_routes(app):
             db.session.add(airdrop)
             db.session.commit()
             
-            # Start airdrop processing in background
-            import threading
-            from utils import process_airdrop_transaction
-            import asyncio
+            # Freeze the eligible recipients into pending transaction records up front
+            from dispatch import recipient_addresses, snapshot_recipients
+            recipient_count = snapshot_recipients(
+                airdrop.id, recipient_addresses(token_mint, exclude_paid=exclude_paid)
+            )
             
-            def process_airdrops():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                for wallet in wallets:
-                    # Create transaction record
-                    transaction = AirdropTransaction(
-                        event_id=airdrop.id,
-                        wallet_address=wallet.address,
-                        status='pending'
-                    )
-                    db.session.add(transaction)
-                    db.session.commit()
-                    
-                    # Process transaction
-                    try:
-                        # Ensure all parameters are not None with defaults
-                        safe_token_mint = token_mint or config.SPL_TOKEN_MINT
-                        safe_amount = amount if amount is not None else config.SPL_TOKEN_AMOUNT
-                        safe_decimals = decimals if decimals is not None else config.SPL_TOKEN_DECIMALS
-                        
-                        result = loop.run_until_complete(process_airdrop_transaction(
-                            wallet_address=wallet.address,
-                            token_mint=safe_token_mint,
-                            token_amount=float(safe_amount),
-                            token_decimals=int(safe_decimals),
-                            sender_secret_key=config.SENDER_SECRET_KEY
-                        ))
-                        
-                        # Update transaction record
-                        transaction.status = 'success' if result['success'] else 'failed'
-                        transaction.transaction_signature = result.get('signature', None)
-                        transaction.error_message = result.get('error', None)
-                        transaction.completed_at = datetime.utcnow()
-                        db.session.commit()
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing airdrop to {wallet.address}: {e}")
-                        transaction.status = 'failed'
-                        transaction.error_message = str(e)
-                        transaction.completed_at = datetime.utcnow()
-                        db.session.commit()
-                
-                logger.info(f"Airdrop {airdrop.id} completed")
-                
-            # Start processing in a background thread
-            thread = threading.Thread(target=process_airdrops)
-            thread.daemon = True
-            thread.start()
+            if recipient_count == 0:
+                db.session.delete(airdrop)
+                db.session.commit()
+                flash('No eligible wallets for this airdrop.', 'warning')
+                return redirect(url_for('admin_airdrops'))
+            
+            # Hand the airdrop to the job queue
+            from worker import enqueue_airdrop
+            enqueue_airdrop(airdrop.id)
             
-            flash(f'Started airdrop of {amount} tokens to {len(wallets)} wallets.', 'success')
+            flash(f'Started airdrop of {amount} tokens to {recipient_count} wallets.', 'success')
             return redirect(url_for('admin_airdrops'))
         
-        airdrops = AirdropEvent.query.order_by(AirdropEvent.created_at.desc()).all()
+        page = paginate(
+            AirdropEvent.query, [AirdropEvent.created_at, AirdropEvent.id],
+            key=lambda airdrop: (airdrop.created_at, airdrop.id), descending=True,
+            after=request.args.get('after'), before=request.args.get('before')
+        )
         form = AirdropForm(
             token_mint=config.SPL_TOKEN_MINT,
             amount=config.SPL_TOKEN_AMOUNT,
             decimals=config.SPL_TOKEN_DECIMALS
         )
-        return render_template('admin/airdrops.html', airdrops=airdrops, form=form)
+        return render_template('admin/airdrops.html', airdrops=page.items, page=page, form=form)
+    
+    @app.route('/admin/airdrops/<int:airdrop_id>')
+    @login_required
+    def admin_airdrop_detail(airdrop_id):
+        # Ensure user is admin
+        if not current_user.is_admin:
+            flash('Access denied', 'danger')
+            return redirect(url_for('dashboard'))
+        
+        airdrop = AirdropEvent.query.get_or_404(airdrop_id)
+        
+        status = request.args.get('status')
+        query = AirdropTransaction.query.filter_by(event_id=airdrop.id)
+        if status in AirdropEvent.STATUS_COUNTERS:
+            query = query.filter_by(status=status)
+        else:
+            status = None
+        
+        page = paginate(
+            query, [AirdropTransaction.id], key=lambda tx: (tx.id,),
+            after=request.args.get('after'), before=request.args.get('before')
+        )
+        return render_template('admin/airdrop_detail.html', airdrop=airdrop,
+                               transactions=page.items, page=page, status=status)
+    
+    @app.route('/admin/airdrops/<int:airdrop_id>/retry', methods=['POST'])
+    @login_required
+    def admin_retry_airdrop(airdrop_id):
+        """Queue the failed transfers of an airdrop for another attempt"""
+        # Ensure user is admin
+        if not current_user.is_admin:
+            flash('Access denied', 'danger')
+            return redirect(url_for('dashboard'))
+        
+        airdrop = AirdropEvent.query.get_or_404(airdrop_id)
+        
+        from dispatch import retry_failed_transactions
+        count = retry_failed_transactions(airdrop.id)
+        if count:
+            from worker import enqueue_airdrop
+            enqueue_airdrop(airdrop.id)
+            flash(f'Retrying {count} failed transfers.', 'success')
+        else:
+            flash('No failed transfers to retry.', 'info')
+        
+        return redirect(url_for('admin_airdrop_detail', airdrop_id=airdrop.id))
     
     @app.route('/admin/settings', methods=['GET'])
     @login_required
@@ -516,23 +576,145 @@ def register_routes(app):
         if not current_user.is_admin and airdrop.started_by != current_user.id:
             return jsonify({'error': 'Access denied'}), 403
         
-        transactions = AirdropTransaction.query.filter_by(event_id=airdrop_id).all()
-        total = len(transactions)
-        completed = sum(1 for tx in transactions if tx.status != 'pending')
-        success = sum(1 for tx in transactions if tx.status == 'success')
-        failed = sum(1 for tx in transactions if tx.status == 'failed')
-        
-        status = 'completed' if completed == total else 'in_progress'
-        
-        return jsonify({
-            'airdrop_id': airdrop_id,
-            'total': total,
-            'completed': completed,
-            'success': success,
-            'failed': failed,
-            'status': status,
-            'progress_percentage': (completed / total * 100) if total > 0 else 0
-        })
+        # Rebuild the counters from the raw transaction rows on request
+        if request.args.get('verify', '').lower() in ('1', 'true', 'yes'):
+            if not airdrop.rebuild_counters():
+                logger.warning(f"Rebuilt inconsistent counters of airdrop {airdrop_id}")
+                db.session.commit()
+        
+        from progress import progress_snapshot
+        return jsonify(progress_snapshot(
+            airdrop_id,
+            airdrop.total_count,
+            airdrop.pending_count,
+            airdrop.sent_count,
+            airdrop.success_count,
+            airdrop.failure_count
+        ))
+    
+    @app.route('/api/airdrops/<int:airdrop_id>/events')
+    @login_required
+    def airdrop_events(airdrop_id):
+        """
+        Stream the progress of an airdrop as server-sent events.
+        Each open stream holds a request worker (a whole process with
+        gunicorn's sync workers), so serve the web app with threaded or async
+        workers and keep AIRDROP_PROGRESS_MAX_STREAMS below their thread
+        count. Beyond that limit viewers get a 503 and poll the status API.
+        """
+        airdrop = AirdropEvent.query.get_or_404(airdrop_id)
+        
+        # Ensure user is admin or is the one who started the airdrop
+        if not current_user.is_admin and airdrop.started_by != current_user.id:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        import json
+        import queue
+        import progress
+        
+        initial = progress.progress_snapshot(
+            airdrop_id,
+            airdrop.total_count,
+            airdrop.pending_count,
+            airdrop.sent_count,
+            airdrop.success_count,
+            airdrop.failure_count
+        )
+        # Release the request's database session before streaming
+        db.session.remove()
+        
+        if not progress.open_stream():
+            response = jsonify({'error': 'Too many progress streams, poll the status API instead'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        
+        def stream():
+            publisher, subscription = progress.subscribe(airdrop_id)
+            try:
+                snapshot = initial
+                yield f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+                while snapshot['status'] != 'completed':
+                    try:
+                        snapshot = subscription.get(timeout=config.AIRDROP_PROGRESS_REFRESH_SECONDS)
+                    except queue.Empty:
+                        # Catch up with progress made by other processes, and keep the connection alive
+                        publisher.refresh()
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+            finally:
+                publisher.unsubscribe(subscription)
+        
+        response = Response(
+            stream_with_context(stream()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        response.call_on_close(progress.close_stream)
+        return response
+        
+    @app.route('/api/airdrops/<int:airdrop_id>/process', methods=['POST'])
+    @login_required
+    def api_process_airdrop(airdrop_id):
+        """Resume processing of the pending transactions of an airdrop"""
+        if not current_user.is_admin:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        airdrop = AirdropEvent.query.get_or_404(airdrop_id)
+        pending = airdrop.pending_count
+        if pending == 0:
+            return jsonify({'status': 'completed', 'message': 'No pending transactions'})
+        
+        from worker import enqueue_airdrop
+        enqueue_airdrop(airdrop.id)
+        
+        return jsonify({'status': 'started', 'pending': pending})
+        
+    @app.route('/api/cache/stats')
+    @login_required
+    def api_cache_stats():
+        """Hit/miss counters of the in-process caches, for monitoring"""
+        if not current_user.is_admin:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        return jsonify({'address': address_cache_stats()})
+        
+    @app.route('/api/rpc/stats')
+    @login_required
+    def api_rpc_stats():
+        """Health and adaptive load limits of the RPC endpoints, for monitoring"""
+        if not current_user.is_admin:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        return jsonify({'endpoints': endpoint_stats()})
+        
+    @app.route(WEBHOOK_PATH, methods=['POST'])
+    @csrf.exempt
+    def telegram_webhook():
+        """Receive a Telegram update (webhook mode) and queue it for the in-process bot"""
+        if config.BOT_UPDATE_MODE != 'webhook':
+            return jsonify({'error': 'Webhook mode is disabled'}), 404
+        
+        # Telegram sends back the secret token the webhook was registered with
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token.encode(), webhook_secret_token().encode()):
+            return jsonify({'error': 'Invalid secret token'}), 403
+        
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or 'update_id' not in data:
+            return jsonify({'error': 'Invalid update'}), 400
+        
+        try:
+            queued = start_bot().feed_update(data)
+        except Exception as e:
+            logger.warning(f"Rejected malformed Telegram update: {e}")
+            return jsonify({'error': 'Invalid update'}), 400
+        
+        # Telegram delivers the update again later if it is not accepted now
+        if not queued:
+            return jsonify({'error': 'Bot unavailable'}), 503
+        return jsonify({'ok': True})
         
     # Wallet withdrawal functionality
     @app.route('/wallets/<int:wallet_id>/withdraw', methods=['GET', 'POST'])
@@ -0,0 +1,462 @@
+"""
+Pooled async Solana JSON-RPC client for the Solana Airdrop Bot.
+One client per event loop keeps HTTP connections alive between requests,
+sends several calls per HTTP request as JSON-RPC batches, adapts the
+requests in flight per endpoint to how the endpoint copes with the load and
+fails over between weighted RPC endpoints, so one slow or failing node does
+not stall an airdrop.
+
+Endpoints come from config.SOLANA_RPC_URLS ("url|weight,url|weight"), or
+config.SOLANA_RPC when no list is configured.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Endpoint health is shared by the clients of every event loop
+_endpoints: Dict[str, "RpcEndpoint"] = {}
+_endpoints_lock = threading.Lock()
+
+# One pooled client per event loop; dropped when the loop goes away
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SolanaRpcClient]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+# Span of the windows the best recent latency of an endpoint is taken over
+_LATENCY_WINDOW_SECONDS = 10.0
+
+
+class RpcError(Exception):
+    """Error object returned by the RPC node for a call (not retried elsewhere)"""
+
+    def __init__(self, error: Any):
+        self.code = error.get("code") if isinstance(error, dict) else None
+        self.message = error.get("message") if isinstance(error, dict) else str(error)
+        super().__init__(f"RPC error {self.code}: {self.message}")
+
+
+class RpcUnavailableError(Exception):
+    """No RPC endpoint could serve a request"""
+
+
+# Node errors that say nothing about the transaction itself: the node was
+# throttling, behind the cluster or had not seen the blockhash yet
+_TRANSIENT_RPC_CODES = {429, -32004, -32005, -32014}
+_TRANSIENT_RPC_MESSAGES = ("blockhash not found", "too many requests", "node is behind")
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Whether a failed call is worth retrying later: timeouts, throttling,
+    unreachable endpoints and expired or unknown blockhashes. Errors about
+    the request itself (bad parameters, failed simulation) are not.
+    """
+    if isinstance(error, (RpcUnavailableError, asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    if isinstance(error, RpcError):
+        message = (error.message or "").lower()
+        return error.code in _TRANSIENT_RPC_CODES or any(text in message for text in _TRANSIENT_RPC_MESSAGES)
+    return False
+
+
+class RateLimiter:
+    """
+    Token bucket capping the request rate sent to a single RPC endpoint.
+    Tokens are reserved under a thread lock so one limiter can be shared by
+    clients running on different threads and event loops.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Reserve one token and return how long the caller must wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        if self.rate <= 0:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the requests in flight to a single RPC endpoint.
+    Every request answered in about the endpoint's best observed latency
+    raises the limit by 1/limit (one slot per round trip); slower answers hold
+    it. An HTTP 429 or a timeout halves it, once per round of requests, so a
+    burst of rejections sent together only counts once. The configured
+    request rate is enforced on top as a hard ceiling.
+    Waiters may belong to different event loops, so slots are counted under
+    a thread lock and waiters are woken with call_soon_threadsafe.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None, rate: float = 0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self._window_min: Optional[float] = None
+        self._previous_window_min: Optional[float] = None
+        self._window_started = 0.0
+        self.rate_limiter = RateLimiter(rate)
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> float:
+        """
+        Wait for a free slot and for the rate ceiling.
+
+        Returns:
+            float: Monotonic time the request was admitted (pass it to the feedback methods)
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    break
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    # A wakeup meant for this waiter goes to the next one
+                    self._wake()
+                raise
+        try:
+            await self.rate_limiter.acquire()
+        except BaseException:
+            self.release()
+            raise
+        return time.monotonic()
+
+    def release(self):
+        """Give back the slot of a finished request"""
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self, latency: float):
+        """Feed back the latency of a successful request"""
+        now = time.monotonic()
+        with self._lock:
+            # Best latency over the current and the previous window, so an
+            # endpoint that became slower for good is re-baselined
+            if self._window_min is None or now - self._window_started > _LATENCY_WINDOW_SECONDS:
+                self._previous_window_min = self._window_min
+                self._window_min = latency
+                self._window_started = now
+            else:
+                self._window_min = min(self._window_min, latency)
+            self.baseline = min(filter(None, (self._previous_window_min, self._window_min)), default=latency)
+            if latency <= max(self.baseline * config.RPC_LATENCY_TOLERANCE, 0.005):
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self._wake()
+
+    def on_overload(self, started: float):
+        """Back off after a request admitted at `started` was throttled or timed out"""
+        with self._lock:
+            if started < self._last_decrease:
+                return
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = time.monotonic()
+        logger.info(f"RPC endpoint overloaded, cutting requests in flight to {int(self.limit)}")
+
+    def _wake(self):
+        # Called with the lock held; woken waiters re-check for a free slot
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            loop, future = self._waiters.popleft()
+            loop.call_soon_threadsafe(_resolve_waiter, future)
+            free -= 1
+
+
+def _resolve_waiter(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class RpcEndpoint:
+    """
+    Health and load limit of a single RPC endpoint.
+    Every failure puts the endpoint on an exponentially growing cooldown
+    during which requests go to the other endpoints; one success clears it.
+    """
+
+    def __init__(self, url: str, weight: float = 1.0):
+        self.url = url
+        self.weight = weight
+        self.failures = 0
+        self.down_until = 0.0
+        self.latency: Optional[float] = None
+        self.limiter = AdaptiveLimiter(
+            config.RPC_ENDPOINT_CONCURRENCY,
+            maximum=config.RPC_MAX_ENDPOINT_CONCURRENCY,
+            rate=config.AIRDROP_RPC_RATE_LIMIT
+        )
+        self._lock = threading.Lock()
+
+    def available(self, now: float) -> bool:
+        """Whether the endpoint is outside its failure cooldown"""
+        return now >= self.down_until
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.failures = 0
+            self.down_until = 0.0
+            # Exponentially weighted moving average of request latency
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        self.limiter.on_success(latency)
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        with self._lock:
+            self.failures += 1
+            cooldown = min(config.RPC_FAILOVER_COOLDOWN_MAX_SECONDS,
+                           config.RPC_FAILOVER_COOLDOWN_SECONDS * 2 ** (self.failures - 1))
+            self.down_until = time.monotonic() + max(cooldown, retry_after or 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current health and load figures, for monitoring"""
+        return {
+            "weight": self.weight,
+            "failures": self.failures,
+            "available": self.available(time.monotonic()),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight
+        }
+
+
+def parse_endpoints(value) -> List[Tuple[str, float]]:
+    """
+    Parse an RPC endpoint list.
+
+    Args:
+        value: Comma-separated string or list of "url" or "url|weight" entries
+
+    Returns:
+        list: (url, weight) pairs; entries with a malformed or non-positive weight get weight 1
+    """
+    entries = value.split(",") if isinstance(value, str) else list(value or [])
+    endpoints = []
+    for entry in entries:
+        url, _, weight = entry.strip().partition("|")
+        if not url:
+            continue
+        try:
+            weight = float(weight) if weight else 1.0
+        except ValueError:
+            weight = 1.0
+        endpoints.append((url.strip(), weight if weight > 0 else 1.0))
+    return endpoints
+
+
+def configured_endpoints() -> List[RpcEndpoint]:
+    """The RPC endpoints currently configured, with their shared health state"""
+    specs = parse_endpoints(config.SOLANA_RPC_URLS) or [(config.SOLANA_RPC, 1.0)]
+    with _endpoints_lock:
+        endpoints = []
+        for url, weight in specs:
+            endpoint = _endpoints.get(url)
+            if endpoint is None:
+                endpoint = _endpoints[url] = RpcEndpoint(url, weight)
+            endpoint.weight = weight
+            if endpoint.limiter.rate_limiter.rate != config.AIRDROP_RPC_RATE_LIMIT:
+                endpoint.limiter.rate_limiter = RateLimiter(config.AIRDROP_RPC_RATE_LIMIT)
+            endpoints.append(endpoint)
+        return endpoints
+
+
+class SolanaRpcClient:
+    """
+    Async JSON-RPC client over a keep-alive HTTP connection pool.
+    Requests go to a healthy endpoint picked at random by weight and wait for
+    a slot of that endpoint's adaptive limiter. On a transport error, timeout,
+    HTTP 429 or 5xx the endpoint is put on cooldown (at least as long as a
+    Retry-After header asks) and the request is retried on the next one;
+    429s and timeouts also shrink the endpoint's limit. Calls answered with a
+    JSON-RPC error are not retried. Use one client per event loop (see
+    get_rpc_client).
+    """
+
+    def __init__(self, endpoints: Optional[Sequence[str]] = None, timeout: Optional[float] = None,
+                 batch_size: Optional[int] = None):
+        self._endpoint_urls = list(endpoints) if endpoints else None
+        self.batch_size = max(1, batch_size or config.RPC_BATCH_SIZE)
+        self._request_id = 0
+        self._http = httpx.AsyncClient(
+            timeout=timeout or config.RPC_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=None,
+                max_keepalive_connections=max(1, config.RPC_MAX_ENDPOINT_CONCURRENCY),
+                keepalive_expiry=config.RPC_KEEPALIVE_SECONDS
+            )
+        )
+
+    @property
+    def endpoints(self) -> List[RpcEndpoint]:
+        if self._endpoint_urls is None:
+            return configured_endpoints()
+        with _endpoints_lock:
+            return [_endpoints.setdefault(url, RpcEndpoint(url)) for url in self._endpoint_urls]
+
+    async def call(self, method: str, params: Optional[list] = None) -> Any:
+        """
+        Make a single RPC call.
+
+        Returns:
+            The call's result
+
+        Raises:
+            RpcError: The node answered with an error
+            RpcUnavailableError: No endpoint could be reached
+        """
+        response = await self._post(self._request(method, params))
+        return _result(response)
+
+    async def batch(self, calls: Sequence[Tuple[str, Optional[list]]]) -> List[Any]:
+        """
+        Make many RPC calls, `batch_size` per HTTP request, with the HTTP
+        requests running concurrently within the per-endpoint limits.
+
+        Args:
+            calls: (method, params) pairs
+
+        Returns:
+            list: One entry per call, in order: its result, or the RpcError /
+                  RpcUnavailableError it failed with
+        """
+        requests = [self._request(method, params) for method, params in calls]
+        chunks = [requests[start:start + self.batch_size] for start in range(0, len(requests), self.batch_size)]
+        answered = await asyncio.gather(*(self._post(chunk) for chunk in chunks), return_exceptions=True)
+
+        results = []
+        for chunk, responses in zip(chunks, answered):
+            if isinstance(responses, Exception):
+                results.extend([responses] * len(chunk))
+                continue
+            # Batch responses may come back in any order
+            by_id = {response.get("id"): response for response in responses if isinstance(response, dict)}
+            for request in chunk:
+                response = by_id.get(request["id"])
+                if response is None:
+                    results.append(RpcError({"message": "missing response in batch"}))
+                    continue
+                try:
+                    results.append(_result(response))
+                except RpcError as e:
+                    results.append(e)
+        return results
+
+    async def aclose(self):
+        """Close the pooled connections"""
+        await self._http.aclose()
+
+    def _request(self, method: str, params: Optional[list]) -> dict:
+        self._request_id += 1
+        request = {"jsonrpc": "2.0", "id": self._request_id, "method": method}
+        if params is not None:
+            request["params"] = params
+        return request
+
+    def _choose(self, endpoints: List[RpcEndpoint], tried: set) -> Optional[RpcEndpoint]:
+        untried = [endpoint for endpoint in endpoints if endpoint.url not in tried]
+        if not untried:
+            return None
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in untried if endpoint.available(now)]
+        if not healthy:
+            # Everything is cooling down: try the endpoint that recovers first
+            return min(untried, key=lambda endpoint: endpoint.down_until)
+        return random.choices(healthy, weights=[endpoint.weight for endpoint in healthy])[0]
+
+    async def _post(self, payload):
+        endpoints = self.endpoints
+        tried = set()
+        last_error = None
+        while True:
+            endpoint = self._choose(endpoints, tried)
+            if endpoint is None:
+                raise RpcUnavailableError(f"All {len(endpoints)} RPC endpoints failed: {last_error!r}")
+            tried.add(endpoint.url)
+
+            started = await endpoint.limiter.acquire()
+            try:
+                response = await self._http.post(endpoint.url, json=payload)
+                response.raise_for_status()
+                body = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                retry_after = None
+                if isinstance(e, httpx.TimeoutException):
+                    endpoint.limiter.on_overload(started)
+                elif isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+                    endpoint.limiter.on_overload(started)
+                    retry_after = _retry_after(e.response)
+                endpoint.record_failure(retry_after)
+                last_error = e
+                logger.warning(f"RPC request to {endpoint.url} failed, failing over: {e!r}")
+                continue
+            finally:
+                endpoint.limiter.release()
+            endpoint.record_success(time.monotonic() - started)
+            return body
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def _result(response: dict) -> Any:
+    if "error" in response:
+        raise RpcError(response["error"])
+    return response.get("result")
+
+
+def get_rpc_client() -> SolanaRpcClient:
+    """Get the pooled RPC client of the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = SolanaRpcClient()
+        return client
+
+
+def endpoint_stats() -> Dict[str, Dict[str, Any]]:
+    """Health and load figures of the configured RPC endpoints"""
+    return {endpoint.url: endpoint.stats() for endpoint in configured_endpoints()}
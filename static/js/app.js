@@ -71,36 +71,83 @@ function updateAirdropProgress() {
     const airdropId = document.getElementById('airdropProgress').getAttribute('data-airdrop-id');
     if (!airdropId) return;
 
+    // Prefer the server-sent progress stream, fall back to polling
+    if (!window.EventSource) {
+        pollAirdropProgress(airdropId);
+        return;
+    }
+
+    const source = new EventSource(`/api/airdrops/${airdropId}/events`);
+    source.addEventListener('progress', event => {
+        const data = JSON.parse(event.data);
+        renderAirdropProgress(data);
+        if (data.status === 'completed') {
+            source.close();
+        }
+    });
+    source.onerror = () => {
+        console.error('Airdrop progress stream interrupted, falling back to polling');
+        source.close();
+        setTimeout(() => pollAirdropProgress(airdropId), 5000);
+    };
+}
+
+function pollAirdropProgress(airdropId) {
     // Fetch the current progress
     fetch(`/api/airdrops/${airdropId}/status`)
         .then(response => response.json())
         .then(data => {
-            if (data.status === 'completed') {
-                document.getElementById('progressBar').style.width = '100%';
-                document.getElementById('progressStatus').innerHTML = 'Completed';
-                return;
-            }
-
-            const total = data.total || 0;
-            const completed = data.completed || 0;
-            const percentage = total > 0 ? Math.round((completed / total) * 100) : 0;
-
-            document.getElementById('progressBar').style.width = `${percentage}%`;
-            document.getElementById('progressStatus').innerHTML = 
-                `${completed} of ${total} transactions (${percentage}%)`;
+            renderAirdropProgress(data);
 
             // If not completed, check again in 3 seconds
             if (data.status !== 'completed') {
-                setTimeout(updateAirdropProgress, 3000);
+                setTimeout(() => pollAirdropProgress(airdropId), 3000);
             }
         })
         .catch(error => {
             console.error('Error updating airdrop progress:', error);
             // Try again in 5 seconds on error
-            setTimeout(updateAirdropProgress, 5000);
+            setTimeout(() => pollAirdropProgress(airdropId), 5000);
         });
 }
 
+function renderAirdropProgress(data) {
+    const total = data.total || 0;
+    const completed = data.completed || 0;
+    const percentage = total > 0 ? Math.round((completed / total) * 100) : 0;
+
+    // Per-status segments and counts (airdrop detail page)
+    const counts = {
+        success: data.success || 0,
+        failed: data.failed || 0,
+        sent: data.sent || 0,
+        pending: Math.max(total - completed - (data.sent || 0), 0)
+    };
+    document.querySelectorAll('[data-progress-bar]').forEach(bar => {
+        const count = counts[bar.getAttribute('data-progress-bar')] || 0;
+        bar.style.width = total > 0 ? `${(count / total) * 100}%` : '0%';
+        bar.textContent = count;
+    });
+    document.querySelectorAll('[data-progress-count]').forEach(element => {
+        element.textContent = counts[element.getAttribute('data-progress-count')] || 0;
+    });
+
+    // Single progress bar with a status line
+    const progressBar = document.getElementById('progressBar');
+    const progressStatus = document.getElementById('progressStatus');
+    if (!progressBar || !progressStatus) return;
+
+    if (data.status === 'completed') {
+        progressBar.style.width = '100%';
+        progressStatus.innerHTML = 'Completed';
+        return;
+    }
+
+    progressBar.style.width = `${percentage}%`;
+    progressStatus.innerHTML =
+        `${completed} of ${total} transactions (${percentage}%)`;
+}
+
 // Confirmation dialogs
 function confirmAction(message, formId) {
     if (confirm(message || 'Are you sure you want to perform this action?')) {
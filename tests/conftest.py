@@ -0,0 +1,49 @@
+"""
+Shared test setup: the application database is a throwaway SQLite file, so
+importing the app never touches real data.
+"""
+import os
+import sys
+import tempfile
+
+import base58
+import pytest
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='airdrop-tests-'), 'test.db')}"
+os.environ["AIRDROP_WORKER_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+
+@pytest.fixture
+def make_airdrop():
+    """
+    Factory for an airdrop event with a pending transfer to each of `count`
+    random wallets (or the given ones); returns the event ID and transfer IDs.
+    The airdrop tables are emptied afterwards.
+    """
+    from app import app, db
+    from models import AirdropEvent, AirdropTransaction
+
+    def make(count: int = 0, wallets=None, token_mint: str = None):
+        wallets = wallets or [base58.b58encode(os.urandom(32)).decode() for _ in range(count)]
+        with app.app_context():
+            event = AirdropEvent(
+                token_mint=token_mint or config.SPL_TOKEN_MINT, token_amount=1, token_decimals=6, started_by=1,
+                total_count=len(wallets), pending_count=len(wallets)
+            )
+            db.session.add(event)
+            db.session.flush()
+            transactions = [AirdropTransaction(event_id=event.id, wallet_address=wallet) for wallet in wallets]
+            db.session.add_all(transactions)
+            db.session.commit()
+            return event.id, [transaction.id for transaction in transactions]
+
+    yield make
+
+    with app.app_context():
+        db.session.query(AirdropTransaction).delete()
+        db.session.query(AirdropEvent).delete()
+        db.session.commit()
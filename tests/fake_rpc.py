@@ -0,0 +1,81 @@
+"""
+Local fake Solana JSON-RPC server for tests.
+Answers single and batched JSON-RPC requests over HTTP from a background
+thread. Each method is served by a handler taking the request's params and
+returning its result; a handler returning FakeRpcServer.NO_RESULT answers
+with a null result. Every request body is recorded for assertions.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+
+class FakeRpcServer:
+    """JSON-RPC server on 127.0.0.1 with pluggable method handlers"""
+
+    NO_RESULT = object()
+
+    def __init__(self):
+        self.handlers: Dict[str, Callable[[list], Any]] = {}
+        self.requests: List[Any] = []
+        self.existing_accounts = set()
+        self.handlers["getMultipleAccounts"] = self._get_multiple_accounts
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests.append(body)
+                if isinstance(body, list):
+                    answer = [server._answer(request) for request in body]
+                else:
+                    answer = server._answer(body)
+                payload = json.dumps(answer).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def calls(self, method: str) -> List[dict]:
+        """Recorded requests for one method, batched or not"""
+        flat = []
+        for body in self.requests:
+            flat.extend(body if isinstance(body, list) else [body])
+        return [request for request in flat if request.get("method") == method]
+
+    def start(self) -> "FakeRpcServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _answer(self, request: dict) -> dict:
+        handler = self.handlers.get(request.get("method"))
+        if handler is None:
+            return {"jsonrpc": "2.0", "id": request.get("id"),
+                    "error": {"code": -32601, "message": "Method not found"}}
+        result = handler(request.get("params") or [])
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": None if result is self.NO_RESULT else result}
+
+    def _get_multiple_accounts(self, params: list) -> dict:
+        account = {"lamports": 2039280, "data": ["", "base64"], "owner": "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA",
+                   "executable": False, "rentEpoch": 0}
+        return {
+            "context": {"slot": 1},
+            "value": [account if address in self.existing_accounts else None for address in params[0]]
+        }
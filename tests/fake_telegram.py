@@ -0,0 +1,102 @@
+"""
+Local fake Telegram Bot API server for tests.
+Serves the methods the bot calls (getMe, setWebhook, sendMessage, ...) under
+/bot<token>/<method> from a background thread and records them. Replies to
+sendMessage can be delayed at random, so concurrently processed updates
+finish out of order unless the bot keeps each chat's updates in order.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs
+
+
+class FakeTelegramServer:
+    """Bot API server on 127.0.0.1 recording calls and sent messages"""
+
+    def __init__(self, max_reply_delay: float = 0.0):
+        self.max_reply_delay = max_reply_delay
+        self.calls: List[Tuple[str, Dict]] = []
+        self.messages: List[Tuple[int, str]] = []
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                content_type = self.headers.get("Content-Type", "")
+                if "json" in content_type:
+                    params = json.loads(raw or b"{}")
+                elif "urlencoded" in content_type:
+                    params = {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+                else:
+                    params = {}
+                payload = json.dumps({"ok": True, "result": server._call(self.path.rsplit("/", 1)[-1], params)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def start(self) -> "FakeTelegramServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def calls_to(self, method: str) -> List[Dict]:
+        with self._lock:
+            return [params for name, params in self.calls if name == method]
+
+    def messages_by_chat(self) -> Dict[int, List[str]]:
+        with self._lock:
+            messages = list(self.messages)
+        by_chat = {}
+        for chat_id, text in messages:
+            by_chat.setdefault(chat_id, []).append(text)
+        return by_chat
+
+    def wait_for_messages(self, count: int, timeout: float = 30.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if len(self.messages) >= count:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def _call(self, method: str, params: Dict):
+        with self._lock:
+            self.calls.append((method, params))
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Test", "username": "test_bot",
+                    "can_join_groups": True, "can_read_all_group_messages": False,
+                    "supports_inline_queries": False}
+        if method == "sendMessage":
+            if self.max_reply_delay:
+                time.sleep(random.uniform(0, self.max_reply_delay))
+            chat_id = int(params["chat_id"])
+            with self._lock:
+                self.messages.append((chat_id, params["text"]))
+            return {"message_id": len(self.messages), "date": 0,
+                    "chat": {"id": chat_id, "type": "private"}, "text": params["text"]}
+        return True
@@ -0,0 +1,145 @@
+"""
+Tests for the confirmation tracker against a local fake RPC server.
+
+Usage:
+    python -m pytest tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from app import app, db
+from confirmation import ConfirmationTracker
+from models import AirdropEvent, AirdropTransaction
+from solana_rpc import get_rpc_client
+
+from tests.fake_rpc import FakeRpcServer
+
+BLOCK_HEIGHT = 1000
+WALLET = "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"
+
+
+@pytest.fixture
+def rpc(monkeypatch):
+    server = FakeRpcServer().start()
+    server.handlers["getBlockHeight"] = lambda params: BLOCK_HEIGHT
+    monkeypatch.setattr(config, "SOLANA_SIMULATE_SENDS", False)
+    monkeypatch.setattr(config, "SOLANA_RPC_READS", True)
+    monkeypatch.setattr(config, "SOLANA_RPC", server.url)
+    monkeypatch.setattr(config, "SOLANA_RPC_URLS", "")
+    yield server
+    server.stop()
+    with app.app_context():
+        db.session.query(AirdropTransaction).delete()
+        db.session.query(AirdropEvent).delete()
+        db.session.commit()
+
+
+def statuses(landed: dict):
+    """getSignatureStatuses handler for transactions only found in the ledger history"""
+    def handler(params):
+        search_history = bool(params[1].get("searchTransactionHistory")) if len(params) > 1 else False
+        value = [landed.get(signature) if search_history else None for signature in params[0]]
+        return {"context": {"slot": 1}, "value": value}
+    return handler
+
+
+def expired_transaction(signature: str) -> int:
+    """An event with one transfer sent under a blockhash that has since expired"""
+    with app.app_context():
+        event = AirdropEvent(
+            token_mint=config.SPL_TOKEN_MINT, token_amount=1, token_decimals=6, started_by=1,
+            total_count=1, sent_count=1
+        )
+        db.session.add(event)
+        db.session.flush()
+        transaction = AirdropTransaction(
+            event_id=event.id, wallet_address=WALLET, status='sent', transaction_signature=signature,
+            sent_at=datetime.utcnow() - timedelta(minutes=10), last_valid_block_height=BLOCK_HEIGHT - 150,
+            attempts=1
+        )
+        db.session.add(transaction)
+        db.session.commit()
+        return transaction.id
+
+
+def poll(tracker: ConfirmationTracker):
+    async def run():
+        try:
+            return await tracker.poll()
+        finally:
+            await get_rpc_client().aclose()
+    return asyncio.run(run())
+
+
+def load(transaction_id: int):
+    with app.app_context():
+        transaction = db.session.get(AirdropTransaction, transaction_id)
+        return transaction, db.session.get(AirdropEvent, transaction.event_id)
+
+
+def test_settles_expired_transaction_found_in_history(rpc):
+    transaction_id = expired_transaction("landed-signature")
+    rpc.handlers["getSignatureStatuses"] = statuses(
+        {"landed-signature": {"slot": 1, "err": None, "confirmationStatus": "finalized"}}
+    )
+
+    assert poll(ConfirmationTracker("tracker-1")) == 1
+
+    transaction, event = load(transaction_id)
+    assert transaction.status == 'success'
+    assert transaction.transaction_signature == "landed-signature"
+    assert transaction.resign_count == 0
+    assert (event.sent_count, event.success_count) == (0, 1)
+    assert not rpc.calls("getLatestBlockhash")
+    lookups = rpc.calls("getSignatureStatuses")
+    assert [call["params"][1]["searchTransactionHistory"] for call in lookups] == [False, True]
+
+
+def test_resigns_expired_transaction_unknown_to_history(rpc):
+    transaction_id = expired_transaction("lost-signature")
+    rpc.handlers["getSignatureStatuses"] = statuses({})
+    rpc.handlers["getLatestBlockhash"] = lambda params: {
+        "context": {"slot": 1},
+        "value": {"blockhash": "4uQeVj5tqViQh7yWWGStvkEG1Zmhx6uasJtWCJziofM", "lastValidBlockHeight": BLOCK_HEIGHT + 150}
+    }
+    rpc.handlers["getMultipleAccounts"] = lambda params: {"context": {"slot": 1}, "value": [None] * len(params[0])}
+
+    poll(ConfirmationTracker("tracker-1"))
+
+    transaction, event = load(transaction_id)
+    assert transaction.status == 'sent'
+    assert transaction.transaction_signature != "lost-signature"
+    assert transaction.resign_count == 1
+    assert transaction.attempts == 1
+    assert transaction.last_valid_block_height == BLOCK_HEIGHT + 150
+    assert event.sent_count == 1
+
+
+def test_leaves_expired_transaction_alone_if_history_lookup_fails(rpc):
+    transaction_id = expired_transaction("unchecked-signature")
+    answered = statuses({})
+    rpc.handlers["getSignatureStatuses"] = (
+        lambda params: FakeRpcServer.NO_RESULT if params[1].get("searchTransactionHistory") else answered(params)
+    )
+
+    poll(ConfirmationTracker("tracker-1"))
+
+    transaction, _ = load(transaction_id)
+    assert transaction.status == 'sent'
+    assert transaction.transaction_signature == "unchecked-signature"
+    assert transaction.resign_count == 0
+
+
+def test_simulated_sends_confirm_without_status_lookups(rpc, monkeypatch):
+    monkeypatch.setattr(config, "SOLANA_SIMULATE_SENDS", True)
+    transaction_id = expired_transaction("simulated-signature")
+
+    poll(ConfirmationTracker("tracker-1"))
+
+    transaction, event = load(transaction_id)
+    assert transaction.status == 'success'
+    assert (event.sent_count, event.success_count) == (0, 1)
+    assert not rpc.calls("getSignatureStatuses") and not rpc.calls("getBlockHeight")
@@ -0,0 +1,80 @@
+"""
+Tests for utils.fetch_accounts_exist against a local fake RPC server.
+
+Usage:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+
+import base58
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solana_rpc import SolanaRpcClient  # noqa: E402
+from utils import GET_MULTIPLE_ACCOUNTS_LIMIT, fetch_accounts_exist  # noqa: E402
+
+from tests.fake_rpc import FakeRpcServer  # noqa: E402
+
+
+@pytest.fixture
+def rpc():
+    server = FakeRpcServer().start()
+    yield server
+    server.stop()
+
+
+def addresses(count: int):
+    return [base58.b58encode(os.urandom(32)).decode() for _ in range(count)]
+
+
+def fetch(rpc: FakeRpcServer, accounts):
+    async def run():
+        client = SolanaRpcClient(endpoints=[rpc.url])
+        try:
+            return await fetch_accounts_exist(accounts, client=client)
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+def test_reports_which_accounts_exist(rpc):
+    accounts = addresses(10)
+    rpc.existing_accounts.update(accounts[::3])
+
+    result = fetch(rpc, accounts)
+
+    assert result == {address: address in rpc.existing_accounts for address in accounts}
+
+
+def test_splits_lookups_per_call_limit_without_account_data(rpc):
+    accounts = addresses(GET_MULTIPLE_ACCOUNTS_LIMIT * 2 + 5)
+
+    result = fetch(rpc, accounts)
+
+    calls = rpc.calls("getMultipleAccounts")
+    assert [len(call["params"][0]) for call in calls] == [GET_MULTIPLE_ACCOUNTS_LIMIT, GET_MULTIPLE_ACCOUNTS_LIMIT, 5]
+    assert all(call["params"][1]["dataSlice"] == {"offset": 0, "length": 0} for call in calls)
+    assert len(result) == len(accounts) and not any(result.values())
+
+
+def test_leaves_out_accounts_of_null_results(rpc):
+    accounts = addresses(GET_MULTIPLE_ACCOUNTS_LIMIT + 1)
+    rpc.existing_accounts.update(accounts)
+    answered = rpc.handlers["getMultipleAccounts"]
+    rpc.handlers["getMultipleAccounts"] = (
+        lambda params: FakeRpcServer.NO_RESULT if len(params[0]) == 1 else answered(params)
+    )
+
+    result = fetch(rpc, accounts)
+
+    assert result == {address: True for address in accounts[:GET_MULTIPLE_ACCOUNTS_LIMIT]}
+
+
+def test_leaves_out_accounts_of_failed_calls(rpc):
+    accounts = addresses(3)
+    del rpc.handlers["getMultipleAccounts"]
+
+    assert fetch(rpc, accounts) == {}
@@ -0,0 +1,34 @@
+"""
+Tests for schema upgrades of existing databases, on SQLite.
+
+Usage:
+    python -m pytest tests
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+import migrations
+from app import app, db
+
+
+def indexes():
+    return {index["name"] for index in inspect(db.engine).get_indexes("airdrop_transaction")}
+
+
+def test_indexes_are_reported_at_start_up_and_built_by_the_explicit_step(caplog):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_airdrop_transaction_status_id"))
+            connection.execute(text("CREATE INDEX ix_airdrop_transaction_event_id ON airdrop_transaction (event_id)"))
+
+        with caplog.at_level(logging.WARNING, logger="migrations"):
+            migrations.upgrade_schema()
+        assert "ix_airdrop_transaction_status_id" in caplog.text
+        assert "ix_airdrop_transaction_status_id" not in indexes()
+
+        migrations.build_indexes()
+
+        assert "ix_airdrop_transaction_status_id" in indexes()
+        assert "ix_airdrop_transaction_event_id" not in indexes()
+        assert indexes() == {index.name for index in db.metadata.tables["airdrop_transaction"].indexes}
@@ -0,0 +1,152 @@
+"""
+Tests for transfer retries: attempt counting, backoff and the admin retry,
+against the throwaway SQLite database.
+
+Usage:
+    python -m pytest tests
+"""
+from datetime import datetime, timedelta
+
+import config
+from app import app, db
+from dispatch import retry_delay, retry_failed_transactions, transaction_result_row, write_transaction_results
+from models import AirdropEvent, AirdropTransaction
+from worker import claim_transactions
+
+TRANSIENT = {"success": False, "error": "RPC timeout", "retryable": True}
+
+
+def load(transaction_id):
+    with app.app_context():
+        return db.session.get(AirdropTransaction, transaction_id)
+
+
+def counters(event_id):
+    with app.app_context():
+        event = db.session.get(AirdropEvent, event_id)
+        return event.pending_count, event.sent_count, event.success_count, event.failure_count
+
+
+def dispatch_result(transaction_id, result):
+    """Claim a transfer and write the result of sending it, as a worker would"""
+    assert claim_transactions("worker-1", 1, 60)[1][0][0] == transaction_id
+    write_transaction_results([transaction_result_row(transaction_id, result)])
+
+
+def set_status(transaction_id, **values):
+    with app.app_context():
+        db.session.query(AirdropTransaction).filter_by(id=transaction_id).update(values)
+        db.session.commit()
+
+
+def test_retry_delay_grows_exponentially_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(config, "AIRDROP_RETRY_BASE_SECONDS", 5)
+    monkeypatch.setattr(config, "AIRDROP_RETRY_MAX_SECONDS", 300)
+
+    for attempts, full in [(1, 5), (2, 10), (4, 40), (7, 300), (100, 300)]:
+        delays = [retry_delay(attempts) for _ in range(50)]
+        assert all(full / 2 <= delay <= full for delay in delays)
+
+
+def test_transient_failure_goes_back_to_pending_after_a_backoff(make_airdrop):
+    event_id, (transaction_id,) = make_airdrop(1)
+
+    before = datetime.utcnow()
+    dispatch_result(transaction_id, TRANSIENT)
+
+    transaction = load(transaction_id)
+    assert (transaction.status, transaction.attempts, transaction.lease_owner) == ('pending', 1, None)
+    assert transaction.completed_at is None
+    assert before + timedelta(seconds=config.AIRDROP_RETRY_BASE_SECONDS / 2) <= transaction.next_attempt_at
+    assert transaction.next_attempt_at <= datetime.utcnow() + timedelta(seconds=config.AIRDROP_RETRY_BASE_SECONDS)
+    assert counters(event_id) == (1, 0, 0, 0)
+    # Not claimable again before its backoff has passed
+    assert claim_transactions("worker-2", 1, 60) == (None, [])
+
+
+def test_transient_failure_is_final_at_max_attempts(make_airdrop, monkeypatch):
+    monkeypatch.setattr(config, "AIRDROP_MAX_ATTEMPTS", 3)
+    event_id, (transaction_id,) = make_airdrop(1)
+
+    for attempt in range(1, 4):
+        set_status(transaction_id, next_attempt_at=None)
+        dispatch_result(transaction_id, TRANSIENT)
+        assert load(transaction_id).attempts == attempt
+
+    transaction = load(transaction_id)
+    assert (transaction.status, transaction.next_attempt_at) == ('failed', None)
+    assert transaction.completed_at is not None
+    assert counters(event_id) == (0, 0, 0, 1)
+
+
+def test_permanent_failure_is_final_at_once(make_airdrop):
+    event_id, (transaction_id,) = make_airdrop(1)
+
+    dispatch_result(transaction_id, {"success": False, "error": "Invalid wallet address"})
+
+    assert (load(transaction_id).status, load(transaction_id).attempts) == ('failed', 1)
+    assert counters(event_id) == (0, 0, 0, 1)
+
+
+def test_resigns_do_not_use_up_attempts(make_airdrop, monkeypatch):
+    monkeypatch.setattr(config, "AIRDROP_MAX_ATTEMPTS", 2)
+    event_id, (transaction_id,) = make_airdrop(1)
+    dispatch_result(transaction_id, {"success": True, "signature": "first", "last_valid_block_height": 100})
+
+    for resign in range(1, 4):
+        set_status(transaction_id, lease_owner="tracker-1", lease_expires_at=datetime.utcnow() + timedelta(seconds=60))
+        row = transaction_result_row(
+            transaction_id, {"success": True, "signature": f"resign-{resign}", "last_valid_block_height": 100 + resign},
+            attempt=False
+        )
+        row["resign_count"] = resign
+        write_transaction_results([row])
+
+    transaction = load(transaction_id)
+    assert (transaction.status, transaction.transaction_signature) == ('sent', "resign-3")
+    assert (transaction.attempts, transaction.resign_count) == (1, 3)
+
+    # Giving up on re-signing sends the transfer back through the retry backoff, with its attempt budget intact
+    set_status(transaction_id, lease_owner="tracker-1", lease_expires_at=datetime.utcnow() + timedelta(seconds=60))
+    row = transaction_result_row(transaction_id, TRANSIENT, attempt=False)
+    row["resign_count"] = 4
+    write_transaction_results([row])
+
+    transaction = load(transaction_id)
+    assert (transaction.status, transaction.attempts, transaction.resign_count) == ('pending', 1, 0)
+    assert transaction.next_attempt_at is not None
+    assert counters(event_id) == (1, 0, 0, 0)
+
+
+def test_admin_retry_requeues_only_the_events_unpaid_failures(make_airdrop):
+    wallets = [f"wallet-{n}" for n in range(4)]
+    event_id, transaction_ids = make_airdrop(wallets=wallets)
+    other_event_id, other_ids = make_airdrop(wallets=wallets[:2])
+    other_mint_id, other_mint_ids = make_airdrop(wallets=wallets[2:3], token_mint="OtherMint1111111111111111111111111111111111")
+
+    def settle(event, ids, statuses):
+        with app.app_context():
+            for transaction_id, status in zip(ids, statuses):
+                db.session.query(AirdropTransaction).filter_by(id=transaction_id).update(
+                    {"status": status, "attempts": 5, "error_message": "failed"}
+                )
+            db.session.query(AirdropEvent).filter_by(id=event).update({
+                "pending_count": statuses.count('pending'), "sent_count": statuses.count('sent'),
+                "success_count": statuses.count('success'), "failure_count": statuses.count('failed')
+            })
+            db.session.commit()
+
+    settle(event_id, transaction_ids, ['failed', 'failed', 'failed', 'success'])
+    # wallet-0 was paid the same token by another airdrop since; wallet-2 only a different one
+    settle(other_event_id, other_ids, ['success', 'failed'])
+    settle(other_mint_id, other_mint_ids, ['success'])
+
+    with app.app_context():
+        assert retry_failed_transactions(event_id) == 2
+
+    assert [load(transaction_id).status for transaction_id in transaction_ids] == ['failed', 'pending', 'pending', 'success']
+    requeued = load(transaction_ids[1])
+    assert (requeued.attempts, requeued.error_message, requeued.next_attempt_at) == (0, None, None)
+    assert counters(event_id) == (2, 0, 1, 1)
+    assert [load(transaction_id).status for transaction_id in other_ids] == ['success', 'failed']
+    assert counters(other_event_id) == (0, 0, 1, 1)
@@ -0,0 +1,92 @@
+"""
+Tests for sending tokens to a single wallet from the web interface.
+
+Usage:
+    python -m pytest tests
+"""
+import uuid
+
+import pytest
+
+import config
+import main  # noqa: F401 (registers the routes)
+from app import app, db
+from models import AirdropEvent, AirdropTransaction, User, WalletAddress
+
+WALLET = "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.config, "WTF_CSRF_ENABLED", False)
+    with app.app_context():
+        name = uuid.uuid4().hex[:12]
+        user = User(username=name, email=f"{name}@example.com")
+        db.session.add(user)
+        db.session.flush()
+        wallet = WalletAddress(WALLET, user.id)
+        db.session.add(wallet)
+        db.session.commit()
+        user_id, wallet_id = user.id, wallet.id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    client.wallet_id = wallet_id
+    yield client
+
+    with app.app_context():
+        db.session.query(AirdropTransaction).delete()
+        db.session.query(AirdropEvent).delete()
+        db.session.query(WalletAddress).filter_by(id=wallet_id).delete()
+        db.session.query(User).filter_by(id=user_id).delete()
+        db.session.commit()
+
+
+def send(client):
+    return client.post(
+        f"/wallets/{client.wallet_id}/send",
+        data={"token_mint": config.SPL_TOKEN_MINT, "amount": "5", "decimals": "6"}
+    )
+
+
+def test_records_the_transfer_as_sent(client):
+    response = send(client)
+
+    assert response.status_code == 302
+    with app.app_context():
+        event = db.session.query(AirdropEvent).one()
+        transaction = db.session.query(AirdropTransaction).one()
+        assert (event.total_count, event.sent_count) == (1, 1)
+        assert (transaction.event_id, transaction.status, transaction.attempts) == (event.id, 'sent', 1)
+        assert transaction.transaction_signature and transaction.sent_at is not None
+
+
+def test_records_nothing_and_sends_nothing_if_the_record_fails(client, monkeypatch):
+    import utils
+    signed = []
+    sign = utils.AirdropContext.sign
+
+    def record_signature(self, message, blockhash):
+        signed.append(sign(self, message, blockhash))
+        return signed[-1]
+
+    monkeypatch.setattr(utils.AirdropContext, "sign", record_signature)
+    commit = db.session.commit
+
+    def failing_commit():
+        if db.session.new:
+            raise RuntimeError("database unavailable")
+        commit()
+
+    monkeypatch.setattr(db.session, "commit", failing_commit)
+
+    response = send(client)
+
+    assert response.status_code == 200
+    assert b"Could not record transaction before sending" in response.data
+    assert len(signed) == 1
+    with app.app_context():
+        assert db.session.query(AirdropEvent).count() == 0
+        assert db.session.query(AirdropTransaction).count() == 0
@@ -0,0 +1,127 @@
+"""
+Tests for the Telegram webhook route, driving the in-process bot against a
+local fake Telegram Bot API server.
+
+Usage:
+    python -m pytest tests
+"""
+import socket
+
+import pytest
+
+import bot
+import config
+import main  # noqa: F401 (registers the routes)
+import presets
+from app import app
+
+from tests.fake_telegram import FakeTelegramServer
+
+SECRET = "test-secret_token-1"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def message_update(update_id: int, chat_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": 0,
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+        "text": text
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def unused_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    """Configure webhook mode; yields a function pointing the bot at a Bot API URL"""
+    monkeypatch.setattr(config, "BOT_UPDATE_MODE", "webhook")
+    monkeypatch.setattr(config, "WEBHOOK_SECRET_TOKEN", SECRET)
+    monkeypatch.setattr(config, "WEBHOOK_BASE_URL", "https://airdrop.example.com")
+    monkeypatch.setattr(bot, "WEBHOOK_READY_TIMEOUT_SECONDS", 2)
+
+    def use_api(url: str):
+        monkeypatch.setattr(config, "TELEGRAM_API_BASE_URL", url)
+
+    yield use_api
+
+    if bot.telegram_bot is not None:
+        running = bot.telegram_bot
+        if running.is_running:
+            running.stop()
+        running.bot_thread.join(timeout=10)
+        bot.telegram_bot = None
+
+
+@pytest.fixture
+def telegram():
+    server = FakeTelegramServer(max_reply_delay=0.02).start()
+    yield server
+    server.stop()
+
+
+def post(client, update, secret=SECRET):
+    headers = {SECRET_HEADER: secret} if secret is not None else {}
+    return client.post(bot.WEBHOOK_PATH, json=update, headers=headers)
+
+
+def test_disabled_outside_webhook_mode(monkeypatch):
+    monkeypatch.setattr(config, "BOT_UPDATE_MODE", "polling")
+
+    assert post(app.test_client(), message_update(1, 1, "/help")).status_code == 404
+
+
+def test_rejects_missing_or_wrong_secret(webhook, telegram):
+    webhook(telegram.url)
+    client = app.test_client()
+
+    assert post(client, message_update(1, 1, "/help"), secret=None).status_code == 403
+    assert post(client, message_update(1, 1, "/help"), secret="wrong").status_code == 403
+    assert bot.telegram_bot is None
+
+
+def test_rejects_malformed_updates(webhook, telegram):
+    webhook(telegram.url)
+    client = app.test_client()
+
+    assert client.post(bot.WEBHOOK_PATH, data="not json", headers={SECRET_HEADER: SECRET}).status_code == 400
+    assert post(client, {"message": {}}).status_code == 400
+    assert post(client, {"update_id": 1, "message": {"text": "no chat"}}).status_code == 400
+
+
+def test_refuses_updates_while_telegram_is_unreachable(webhook):
+    webhook(unused_url())
+
+    # The bot cannot start, so Telegram must keep the update and deliver it again
+    assert post(app.test_client(), message_update(1, 1, "/help")).status_code == 503
+
+
+def test_answers_each_chat_in_order(webhook, telegram):
+    webhook(telegram.url)
+    client = app.test_client()
+    chats, commands = 30, ["/start", "/help", "/start", "/help"]
+
+    update_id = 0
+    for command in commands:
+        for chat_id in range(1000, 1000 + chats):
+            update_id += 1
+            assert post(client, message_update(update_id, chat_id, command)).status_code == 200
+
+    assert telegram.wait_for_messages(chats * len(commands))
+    replies = {presets.WELCOME_MESSAGE: "/start", presets.HELP_MESSAGE: "/help"}
+    by_chat = telegram.messages_by_chat()
+    assert len(by_chat) == chats
+    assert all([replies[text] for text in texts] == commands for texts in by_chat.values())
+
+    registered = telegram.calls_to("setWebhook")
+    assert registered[0]["url"] == "https://airdrop.example.com" + bot.WEBHOOK_PATH
+    assert registered[0]["secret_token"] == SECRET
@@ -0,0 +1,107 @@
+"""
+Tests for associated token account derivation, checked against solders, and
+for the TokenAccount cache.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+
+import base58
+import pytest
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+
+import utils
+from app import app, db
+from models import TokenAccount
+from utils import (
+    ASSOCIATED_TOKEN_PROGRAM_ID,
+    TOKEN_PROGRAM_ID,
+    derive_token_address,
+    derive_token_addresses,
+    find_program_address
+)
+
+MINTS = [
+    "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v",
+    "7d7jZLzHHefeSDqJj9EJhTrA1Ujmsb3saxs5vPdtpump",
+]
+
+
+def wallets(count: int):
+    # Real wallets are ed25519 public keys; random bytes also cover off-curve owners
+    keys = [bytes(Keypair().pubkey()) for _ in range(count // 2)]
+    keys += [os.urandom(32) for _ in range(count - len(keys))]
+    return [base58.b58encode(key).decode() for key in keys]
+
+
+def expected_token_account(wallet: str, mint: str) -> str:
+    address, _ = Pubkey.find_program_address(
+        [bytes(Pubkey.from_string(wallet)), bytes(Pubkey.from_string(TOKEN_PROGRAM_ID)), bytes(Pubkey.from_string(mint))],
+        Pubkey.from_string(ASSOCIATED_TOKEN_PROGRAM_ID)
+    )
+    return str(address)
+
+
+@pytest.fixture
+def token_accounts():
+    yield
+    with app.app_context():
+        db.session.query(TokenAccount).delete()
+        db.session.commit()
+
+
+def test_curve_check_matches_solders():
+    points = [bytes(Keypair().pubkey()) for _ in range(200)] + [os.urandom(32) for _ in range(800)]
+
+    assert [utils._is_on_curve(point) for point in points] == [
+        Pubkey(point).is_on_curve() for point in points
+    ]
+
+
+def test_program_address_and_bump_match_solders():
+    program_id = bytes(Pubkey.from_string(ASSOCIATED_TOKEN_PROGRAM_ID))
+    for _ in range(200):
+        seeds = [os.urandom(32), os.urandom(7)]
+        address, bump = find_program_address(seeds, program_id)
+        expected, expected_bump = Pubkey.find_program_address(seeds, Pubkey(program_id))
+        assert (address, bump) == (bytes(expected), expected_bump)
+
+
+@pytest.mark.parametrize("mint", MINTS)
+def test_token_addresses_match_solders(mint):
+    owners = wallets(500)
+
+    assert derive_token_addresses(owners, mint) == [expected_token_account(wallet, mint) for wallet in owners]
+
+
+def test_token_addresses_from_the_process_pool_match_solders(monkeypatch):
+    monkeypatch.setattr(utils.config, "ATA_DERIVATION_POOL_THRESHOLD", 1)
+    owners = wallets(300)
+
+    assert derive_token_addresses(owners, MINTS[0], max_workers=2) == [
+        expected_token_account(wallet, MINTS[0]) for wallet in owners
+    ]
+
+
+def test_resolve_derives_only_accounts_not_cached(token_accounts, monkeypatch):
+    owners = wallets(6)
+    derived = []
+
+    def derive(wallet_addresses, token_mint):
+        derived.append(list(wallet_addresses))
+        return [derive_token_address(wallet, token_mint) for wallet in wallet_addresses]
+
+    monkeypatch.setattr("models.derive_token_addresses", derive)
+    with app.app_context():
+        first = TokenAccount.resolve(owners[:4], MINTS[0])
+        second = TokenAccount.resolve(owners + owners[:2], MINTS[0])
+        other_mint = TokenAccount.resolve(owners[:1], MINTS[1])
+
+    assert derived == [owners[:4], owners[4:], owners[:1]]
+    assert first == {wallet: expected_token_account(wallet, MINTS[0]) for wallet in owners[:4]}
+    assert second == {wallet: expected_token_account(wallet, MINTS[0]) for wallet in owners}
+    assert other_mint == {owners[0]: expected_token_account(owners[0], MINTS[1])}
+    with app.app_context():
+        assert db.session.query(TokenAccount).filter(TokenAccount.wallet_address.in_(owners)).count() == 7
@@ -0,0 +1,159 @@
+"""
+Tests for the airdrop job queue: claims, leases and result writes, against
+the throwaway SQLite database.
+
+Usage:
+    python -m pytest tests
+"""
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+import dispatch
+from app import app, db
+from dispatch import write_transaction_results
+from models import AirdropEvent, AirdropTransaction
+from worker import AirdropWorker, claim_transactions, renew_leases
+
+
+def rows(transaction_ids):
+    with app.app_context():
+        return {
+            transaction.id: (
+                transaction.status, transaction.transaction_signature, transaction.attempts,
+                transaction.next_attempt_at, transaction.lease_owner, transaction.error_message
+            )
+            for transaction in db.session.query(AirdropTransaction).filter(AirdropTransaction.id.in_(transaction_ids))
+        }
+
+
+def counters(event_id):
+    with app.app_context():
+        event = db.session.get(AirdropEvent, event_id)
+        return event.pending_count, event.sent_count, event.success_count, event.failure_count
+
+
+def expire_leases(transaction_ids):
+    """Let the leases on transfers run out, as if their worker had crashed"""
+    with app.app_context():
+        db.session.execute(
+            update(AirdropTransaction)
+            .where(AirdropTransaction.id.in_(transaction_ids))
+            .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        db.session.commit()
+
+
+def test_concurrent_workers_claim_disjoint_chunks(make_airdrop):
+    event_id, transaction_ids = make_airdrop(200)
+    claims = {}
+
+    def drain(worker_id):
+        claims[worker_id] = []
+        while True:
+            claimed_event, claimed = claim_transactions(worker_id, 7, 60)
+            if not claimed:
+                return
+            assert claimed_event == event_id
+            claims[worker_id].extend(transaction_id for transaction_id, _ in claimed)
+
+    threads = [threading.Thread(target=drain, args=(f"worker-{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    claimed = [transaction_id for chunk in claims.values() for transaction_id in chunk]
+    assert sorted(claimed) == transaction_ids
+    owners = {transaction_id: row[4] for transaction_id, row in rows(transaction_ids).items()}
+    assert all(owners[transaction_id] == worker_id for worker_id, chunk in claims.items() for transaction_id in chunk)
+
+
+def test_crashed_workers_chunk_is_claimed_again_once_its_lease_expires(make_airdrop):
+    event_id, transaction_ids = make_airdrop(5)
+    assert claim_transactions("crashed", 10, 60)[1]
+
+    assert claim_transactions("survivor", 10, 60) == (None, [])
+
+    expire_leases(transaction_ids)
+    claimed_event, claimed = claim_transactions("survivor", 10, 60)
+    assert claimed_event == event_id
+    assert [transaction_id for transaction_id, _ in claimed] == transaction_ids
+
+
+def test_renewing_extends_only_the_workers_own_pending_leases(make_airdrop):
+    _, first = make_airdrop(3)
+    claim_transactions("worker-1", 3, 60)
+    _, second = make_airdrop(2)
+    claim_transactions("worker-2", 2, 60)
+    write_transaction_results([dispatch.transaction_result_row(first[0], {"success": True, "signature": "s"})])
+    expire_leases(first + second)
+
+    assert renew_leases("worker-1", 60) == 2
+
+    assert [transaction_id for transaction_id, _ in claim_transactions("worker-3", 10, 60)[1]] == second
+    leases = rows(first + second)
+    assert [leases[transaction_id][4] for transaction_id in first] == [None, "worker-1", "worker-1"]
+    assert [leases[transaction_id][4] for transaction_id in second] == ["worker-3", "worker-3"]
+
+
+def test_worker_holds_its_chunk_until_the_results_are_saved(make_airdrop, monkeypatch):
+    event_id, transaction_ids = make_airdrop(10)
+    failures = {"left": 3}
+    write = dispatch.write_transaction_results
+
+    def flaky_write(result_rows):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("database unavailable")
+        write(result_rows)
+
+    monkeypatch.setattr(dispatch, "write_transaction_results", flaky_write)
+    worker = AirdropWorker("worker-1", lease_seconds=2)
+    stolen = []
+    done = threading.Event()
+
+    def steal():
+        # Another worker keeps trying to claim the chunk while its results are unsaved
+        while not done.wait(0.2):
+            stolen.extend(claim_transactions("worker-2", 10, 60)[1])
+
+    async def run():
+        _, claimed = await asyncio.to_thread(claim_transactions, worker.worker_id, 10, worker.lease_seconds)
+        await worker._process(event_id, claimed)
+
+    thief = threading.Thread(target=steal)
+    thief.start()
+    try:
+        asyncio.run(run())
+    finally:
+        done.set()
+        thief.join()
+
+    assert failures["left"] == 0
+    assert stolen == []
+    saved = rows(transaction_ids)
+    assert all(row[4] is None and row[2] == 1 for row in saved.values())
+    assert sum(counters(event_id)) == len(transaction_ids)
+
+
+def test_writing_the_same_results_again_changes_nothing(make_airdrop):
+    event_id, transaction_ids = make_airdrop(3)
+    claim_transactions("worker-1", 3, 60)
+    results = [
+        dispatch.transaction_result_row(transaction_ids[0], {"success": True, "signature": "sig-1"}),
+        dispatch.transaction_result_row(transaction_ids[1], {"success": False, "error": "timeout", "retryable": True}),
+        dispatch.transaction_result_row(transaction_ids[2], {"success": False, "error": "invalid"}),
+    ]
+
+    write_transaction_results(results)
+    written, written_counters = rows(transaction_ids), counters(event_id)
+    write_transaction_results(results)
+
+    assert rows(transaction_ids) == written
+    assert counters(event_id) == written_counters == (1, 1, 0, 1)
+    assert [written[transaction_id][:3] for transaction_id in transaction_ids] == [
+        ('sent', "sig-1", 1), ('pending', None, 1), ('failed', None, 1)
+    ]
@@ -3,20 +3,96 @@ Utility functions for the Solana Airdrop Application.
 Provides functionality for both web interface and Telegram bot.
 This is a simplified version without direct Solana dependencies for development.
 """
+import asyncio
+import atexit
+import hashlib
 import logging
+import multiprocessing
 import os
 import re
+import threading
+import time
 import base58
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import config
+from solana_rpc import SolanaRpcClient, get_rpc_client, is_transient_error
 
 logger = logging.getLogger(__name__)
 
-# Initialize Solana client placeholder
-SOLANA_RPC = os.environ.get("SOLANA_RPC", "https://api.mainnet-beta.solana.com")
+# Transaction size limits used to pack several transfers into one transaction
+PACKET_DATA_SIZE = 1232  # Maximum serialized transaction size in bytes
+_TRANSFER_TX_BASE_SIZE = (
+    1 + 64          # signature count + fee payer signature
+    + 3             # message header
+    + 1 + 4 * 32    # account keys: sender, sender token account, mint, token program
+    + 32            # recent blockhash
+    + 1             # instruction count
+)
+_TRANSFER_IX_SIZE = 32 + 1 + 1 + 4 + 1 + 10  # recipient token account + TransferChecked instruction
+_CREATE_ATA_BASE_SIZE = 2 * 32  # system program + associated token program keys
+_CREATE_ATA_IX_SIZE = 32 + 1 + 1 + 6 + 1 + 1  # owner wallet + CreateIdempotent instruction
+
+# Program IDs used to derive associated token accounts
+TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+ASSOCIATED_TOKEN_PROGRAM_ID = "ATokenGPvbdGVxr1b2hvZbsiqW5xWH25efTNsLJA8knL"
+_TOKEN_PROGRAM_ID_BYTES = base58.b58decode(TOKEN_PROGRAM_ID)
+_ASSOCIATED_TOKEN_PROGRAM_ID_BYTES = base58.b58decode(ASSOCIATED_TOKEN_PROGRAM_ID)
+
+# ed25519 field prime and curve constant d, for the on-curve check of PDAs
+_ED25519_P = 2 ** 255 - 19
+_ED25519_D = -121665 * pow(121666, _ED25519_P - 2, _ED25519_P) % _ED25519_P
+
+# Maximum number of accounts per getMultipleAccounts request
+GET_MULTIPLE_ACCOUNTS_LIMIT = 100
+
+# Maximum number of signatures per getSignatureStatuses request
+GET_SIGNATURE_STATUSES_LIMIT = 256
+
+# Associated token program instruction index of CreateIdempotent
+_CREATE_IDEMPOTENT_INSTRUCTION = 1
+
+# SPL Token program instruction index of TransferChecked
+_TRANSFER_CHECKED_INSTRUCTION = 12
+_MAX_U64 = 2 ** 64 - 1
+
+# Base58 alphabet used by Solana addresses
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_ADDRESS_PATTERN = re.compile(r'[1-9A-HJ-NP-Za-km-z]{32,44}')
+
+# The base58 alphabet is in ASCII order, so base58 strings of equal length
+# compare like the numbers they encode. After k leading '1's (zero bytes) the
+# rest of an address must decode to exactly 32 - k bytes, i.e. lie in
+# [2^(8*(31-k)), 2^(8*(32-k))). These are the encoded bounds for each k, which
+# turn the decode into two string comparisons.
+_DECODED_32_BOUNDS = [
+    (base58.b58encode_int(1 << 8 * (31 - k)).decode(), base58.b58encode_int(1 << 8 * (32 - k)).decode())
+    for k in range(32)
+]
+
+def _decodes_to_32_bytes(address: str) -> bool:
+    """Check that a base58 string decodes to exactly 32 bytes without decoding it"""
+    rest = address.lstrip('1')
+    leading = len(address) - len(rest)
+    if leading >= 32:
+        return leading == 32 and not rest
+    low, high = _DECODED_32_BOUNDS[leading]
+    size = len(rest)
+    return (
+        (size > len(low) or (size == len(low) and rest >= low))
+        and (size < len(high) or (size == len(high) and rest < high))
+    )
 
 def validate_solana_address(address: str) -> bool:
     """
     Validate if a string is a valid Solana address.
+    Results are memoized in a bounded LRU cache (see address_cache_stats).
     
     Args:
         address: The address to validate
@@ -24,22 +100,42 @@ def validate_solana_address(address: str) -> bool:
     Returns:
         bool: True if valid, False otherwise
     """
-    try:
-        # Simple validation for development:
-        # Solana addresses are base58-encoded and 32-44 characters long
-        if not re.match(r'^[1-9A-HJ-NP-Za-km-z]{32,44}$', address):
-            return False
-            
-        # Try to decode as base58 (should be 32 bytes)
-        decoded = base58.b58decode(address)
-        return len(decoded) == 32
-    except Exception as e:
-        logger.debug(f"Invalid Solana address: {e}")
+    # Only plausible lengths reach the cache, so arbitrary text (e.g. Telegram
+    # messages) cannot fill it with large entries
+    if not isinstance(address, str) or not 32 <= len(address) <= 44:
+        return False
+    return _validate_solana_address(address)
+
+@lru_cache(maxsize=config.ADDRESS_CACHE_SIZE)
+def _validate_solana_address(address: str) -> bool:
+    # Solana addresses are base58-encoded, 32-44 characters long and decode to 32 bytes
+    if _ADDRESS_PATTERN.fullmatch(address) is None:
         return False
+    return _decodes_to_32_bytes(address)
+
+def validate_solana_addresses(addresses: Iterable[str]) -> bytearray:
+    """
+    Validate many Solana addresses at once (imports, pre-airdrop sweeps).
+    Same rules as validate_solana_address, without going through its cache,
+    which one-off sweeps would only churn.
+    
+    Args:
+        addresses: The addresses to validate
+        
+    Returns:
+        bytearray: 1 for each valid address and 0 for each invalid one, in input order
+    """
+    fullmatch = _ADDRESS_PATTERN.fullmatch
+    return bytearray(
+        isinstance(address, str) and fullmatch(address) is not None and _decodes_to_32_bytes(address)
+        for address in addresses
+    )
 
+@lru_cache(maxsize=config.ADDRESS_CACHE_SIZE)
 def format_solana_address(address: str) -> str:
     """
     Format a Solana address for display (truncate middle).
+    Results are memoized in a bounded LRU cache (see address_cache_stats).
     
     Args:
         address: The address to format
@@ -52,6 +148,18 @@ def format_solana_address(address: str) -> str:
     
     return f"{address[:5]}...{address[-4:]}"
 
+def address_cache_stats() -> Dict[str, dict]:
+    """
+    Get the hit/miss counters of the address caches for monitoring.
+    
+    Returns:
+        dict: hits, misses, maxsize and currsize of each cache
+    """
+    return {
+        "validate_solana_address": _validate_solana_address.cache_info()._asdict(),
+        "format_solana_address": format_solana_address.cache_info()._asdict()
+    }
+
 def sol_to_lamports(sol_amount: float) -> int:
     """
     Convert SOL to lamports.
@@ -107,10 +215,49 @@ def format_token_amount(amount: float, decimals: int) -> str:
     else:
         return integer_part
 
+def _is_on_curve(point: bytes) -> bool:
+    """
+    Check whether 32 bytes are a valid compressed ed25519 point.
+    Follows the curve25519-dalek decompression Solana uses: the top bit is the
+    sign of x, and the point exists if (y^2 - 1) / (d*y^2 + 1) is a square mod p.
+    """
+    y = (int.from_bytes(point, "little") & ((1 << 255) - 1)) % _ED25519_P
+    y2 = y * y % _ED25519_P
+    u = (y2 - 1) % _ED25519_P
+    v = (_ED25519_D * y2 + 1) % _ED25519_P
+    # u/v is a square exactly when u*v is (v is never 0), so Euler's criterion
+    # needs one exponentiation and no inversion
+    legendre = pow(u * v % _ED25519_P, (_ED25519_P - 1) // 2, _ED25519_P)
+    return legendre != _ED25519_P - 1
+
+def find_program_address(seeds: List[bytes], program_id: bytes) -> Tuple[bytes, int]:
+    """
+    Find a program derived address: the first bump seed, counting down from
+    255, whose SHA-256 hash falls off the ed25519 curve.
+    
+    Args:
+        seeds: Seed byte strings
+        program_id: Owning program ID (32 bytes)
+        
+    Returns:
+        tuple: The derived address bytes and its bump seed
+    """
+    base = hashlib.sha256()
+    for seed in seeds:
+        base.update(seed)
+    for bump in range(255, -1, -1):
+        candidate = base.copy()
+        candidate.update(bytes([bump]))
+        candidate.update(program_id)
+        candidate.update(b"ProgramDerivedAddress")
+        address = candidate.digest()
+        if not _is_on_curve(address):
+            return address, bump
+    raise ValueError("Unable to find a viable program address bump seed")
+
 def derive_token_address(wallet_address: str, token_mint: str) -> str:
     """
     Derive the associated token account address for a wallet and mint.
-    This is a simplified mock version for development.
     
     Args:
         wallet_address: Wallet address
@@ -119,8 +266,493 @@ def derive_token_address(wallet_address: str, token_mint: str) -> str:
     Returns:
         str: Associated token account address
     """
-    # In real implementation, this would call SPL Token program to derive ATA
-    return f"ATA-{wallet_address[:5]}-{token_mint[:5]}"
+    address, _ = find_program_address(
+        [base58.b58decode(wallet_address), _TOKEN_PROGRAM_ID_BYTES, base58.b58decode(token_mint)],
+        _ASSOCIATED_TOKEN_PROGRAM_ID_BYTES
+    )
+    return base58.b58encode(address).decode()
+
+def _derive_token_addresses_chunk(wallet_addresses: List[str], token_mint: str) -> List[str]:
+    return [derive_token_address(wallet_address, token_mint) for wallet_address in wallet_addresses]
+
+# Derivation process pools by size, started on first use and kept for the life of the process
+_derivation_pools: Dict[int, ProcessPoolExecutor] = {}
+_derivation_pools_lock = threading.Lock()
+
+def _derivation_pool(workers: int) -> ProcessPoolExecutor:
+    with _derivation_pools_lock:
+        pool = _derivation_pools.get(workers)
+        if pool is None:
+            # Spawned workers stay safe when the caller is a multi-threaded server or bot
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _derivation_pools[workers] = pool
+        return pool
+
+@atexit.register
+def _shutdown_derivation_pools():
+    with _derivation_pools_lock:
+        pools = list(_derivation_pools.values())
+        _derivation_pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def derive_token_addresses(wallet_addresses: List[str], token_mint: str,
+                           max_workers: Optional[int] = None) -> List[str]:
+    """
+    Derive the associated token accounts of many wallets for one mint.
+    Each derivation is a PDA search (SHA-256 plus a curve check per bump), so
+    large batches are spread over a long-lived process pool; small ones run
+    inline. The pool is started once and reused, so even a single claimed
+    chunk of an airdrop is worth sending to it.
+    
+    Args:
+        wallet_addresses: Validated wallet addresses
+        token_mint: Token mint address
+        max_workers: Pool size (defaults to ATA_DERIVATION_WORKERS, then the CPU count)
+        
+    Returns:
+        list: Associated token account addresses, in input order
+    """
+    wallet_addresses = list(wallet_addresses)
+    workers = max_workers or config.ATA_DERIVATION_WORKERS or os.cpu_count() or 1
+    if workers <= 1 or len(wallet_addresses) < config.ATA_DERIVATION_POOL_THRESHOLD:
+        return _derive_token_addresses_chunk(wallet_addresses, token_mint)
+    
+    chunk_size = -(-len(wallet_addresses) // (workers * 4))
+    chunks = [wallet_addresses[i:i + chunk_size] for i in range(0, len(wallet_addresses), chunk_size)]
+    try:
+        results = _derivation_pool(workers).map(_derive_token_addresses_chunk, chunks, [token_mint] * len(chunks))
+        return [address for chunk in results for address in chunk]
+    except BrokenProcessPool as e:
+        # A worker process died; start a fresh pool next time and finish this batch inline
+        logger.error(f"Token account derivation pool failed: {e}")
+        with _derivation_pools_lock:
+            _derivation_pools.pop(workers, None)
+        return _derive_token_addresses_chunk(wallet_addresses, token_mint)
+
+def estimate_transfer_transaction_size(num_transfers: int, num_creates: int = 0) -> int:
+    """
+    Estimate the serialized size of a transaction carrying SPL token transfers.
+    
+    Args:
+        num_transfers: Number of TransferChecked instructions in the transaction
+        num_creates: Number of recipient token accounts the transaction also creates
+        
+    Returns:
+        int: Estimated transaction size in bytes
+    """
+    size = _TRANSFER_TX_BASE_SIZE + num_transfers * _TRANSFER_IX_SIZE
+    account_keys = num_transfers + 4
+    if num_creates:
+        size += _CREATE_ATA_BASE_SIZE + num_creates * _CREATE_ATA_IX_SIZE
+        account_keys += num_creates + 2
+    # Compact-u16 lengths take a second byte once they pass 127 entries
+    if account_keys > 127:
+        size += 1
+    if num_transfers + num_creates > 127:
+        size += 1
+    return size
+
+def max_transfers_per_transaction(max_size: int = PACKET_DATA_SIZE) -> int:
+    """
+    Get the number of transfers that fit in a single transaction.
+    
+    Args:
+        max_size: Maximum transaction size in bytes
+        
+    Returns:
+        int: Maximum number of transfers per transaction
+    """
+    count = 1
+    while estimate_transfer_transaction_size(count + 1) <= max_size:
+        count += 1
+    return count
+
+def pack_transfers(recipients: Iterable, max_transfers: Optional[int] = None,
+                   needs_create: Optional[Callable] = None) -> Iterable[list]:
+    """
+    Group recipients into transactions holding as many transfers as fit.
+    
+    Args:
+        recipients: Recipient entries (wallet addresses or records carrying them)
+        max_transfers: Upper bound on transfers per transaction (defaults to the packet size limit)
+        needs_create: Predicate telling whether a recipient's token account must be
+                      created in the same transaction, which takes extra space
+        
+    Returns:
+        Iterable of recipient groups, one per transaction
+    """
+    limit = max_transfers_per_transaction()
+    if max_transfers:
+        limit = min(limit, max_transfers)
+    
+    group = []
+    creates = 0
+    for recipient in recipients:
+        create = bool(needs_create and needs_create(recipient))
+        if group and (
+            len(group) >= limit
+            or estimate_transfer_transaction_size(len(group) + 1, creates + create) > PACKET_DATA_SIZE
+        ):
+            yield group
+            group = []
+            creates = 0
+        group.append(recipient)
+        creates += create
+    if group:
+        yield group
+
+async def fetch_accounts_exist(addresses: List[str], client: Optional[SolanaRpcClient] = None) -> Dict[str, bool]:
+    """
+    Check which accounts exist with batched getMultipleAccounts calls.
+    Addresses go out GET_MULTIPLE_ACCOUNTS_LIMIT per call, and the calls go
+    out as JSON-RPC batches over the pooled RPC client. Only existence
+    matters, so an empty data slice keeps the responses small.
+    
+    Args:
+        addresses: Account addresses to look up
+        client: RPC client to use (defaults to the event loop's pooled client)
+        
+    Returns:
+        dict: {address: exists}; addresses of calls that failed are left out
+    """
+    client = client or get_rpc_client()
+    batches = [
+        addresses[start:start + GET_MULTIPLE_ACCOUNTS_LIMIT]
+        for start in range(0, len(addresses), GET_MULTIPLE_ACCOUNTS_LIMIT)
+    ]
+    options = {"encoding": "base64", "dataSlice": {"offset": 0, "length": 0}}
+    responses = await client.batch([("getMultipleAccounts", [batch, options]) for batch in batches])
+    
+    results = {}
+    for batch, response in zip(batches, responses):
+        if isinstance(response, Exception):
+            logger.warning(f"getMultipleAccounts for {len(batch)} accounts failed: {response}")
+            continue
+        value = response.get("value") if isinstance(response, dict) else None
+        if not isinstance(value, list) or len(value) != len(batch):
+            logger.warning(f"getMultipleAccounts for {len(batch)} accounts returned no account list: {response!r}")
+            continue
+        for address, account in zip(batch, value):
+            results[address] = account is not None
+    return results
+
+async def fetch_signature_statuses(signatures: List[str], client: Optional[SolanaRpcClient] = None,
+                                   search_history: bool = False) -> Dict[str, Optional[dict]]:
+    """
+    Look up the status of sent transactions with batched getSignatureStatuses
+    calls, GET_SIGNATURE_STATUSES_LIMIT signatures per call. With
+    SOLANA_SIMULATE_SENDS nothing was broadcast, so every transaction
+    reports as finalized without an RPC call.
+    
+    Args:
+        signatures: Transaction signatures to look up
+        client: RPC client to use (defaults to the event loop's pooled client)
+        search_history: Also search the ledger history; without it only the
+                        node's recent status cache (a few minutes of slots) is
+                        checked, so older transactions that landed report as None
+        
+    Returns:
+        dict: {signature: status, or None if the cluster does not know it};
+              signatures of calls that failed are left out
+    """
+    if config.SOLANA_SIMULATE_SENDS:
+        return {signature: {"err": None, "confirmationStatus": "finalized"} for signature in signatures}
+    
+    client = client or get_rpc_client()
+    batches = [
+        signatures[start:start + GET_SIGNATURE_STATUSES_LIMIT]
+        for start in range(0, len(signatures), GET_SIGNATURE_STATUSES_LIMIT)
+    ]
+    options = {"searchTransactionHistory": search_history}
+    responses = await client.batch([("getSignatureStatuses", [batch, options]) for batch in batches])
+    
+    results = {}
+    for batch, response in zip(batches, responses):
+        if isinstance(response, Exception):
+            logger.warning(f"getSignatureStatuses for {len(batch)} signatures failed: {response}")
+            continue
+        value = response.get("value") if isinstance(response, dict) else None
+        if not isinstance(value, list) or len(value) != len(batch):
+            logger.warning(f"getSignatureStatuses for {len(batch)} signatures returned no status list: {response!r}")
+            continue
+        results.update(zip(batch, value))
+    return results
+
+async def fetch_block_height(client: Optional[SolanaRpcClient] = None) -> Optional[int]:
+    """Current block height, to tell whether a blockhash has expired (None while sends are simulated)"""
+    if config.SOLANA_SIMULATE_SENDS:
+        return None
+    client = client or get_rpc_client()
+    return await client.call("getBlockHeight", [{"commitment": "confirmed"}])
+
+# A recent blockhash with the block height and local time it stops being valid at
+Blockhash = namedtuple("Blockhash", ["value", "last_valid_block_height", "expires_at"])
+
+async def fetch_latest_blockhash(client: Optional[SolanaRpcClient] = None) -> Blockhash:
+    """
+    Fetch a recent blockhash for signing transactions.
+    Without SOLANA_RPC_READS a random one is made up instead.
+    
+    Returns:
+        Blockhash: The blockhash, expiring BLOCKHASH_TTL_SECONDS from now
+    """
+    expires_at = time.monotonic() + config.BLOCKHASH_TTL_SECONDS
+    if not config.SOLANA_RPC_READS:
+        return Blockhash(base58.b58encode(os.urandom(32)).decode(), None, expires_at)
+    client = client or get_rpc_client()
+    result = await client.call("getLatestBlockhash", [{"commitment": "confirmed"}])
+    return Blockhash(result["value"]["blockhash"], result["value"]["lastValidBlockHeight"], expires_at)
+
+class BlockhashCache:
+    """
+    Recent blockhash shared by every transaction being signed.
+    Signers read the current blockhash without taking a lock (it is one
+    immutable tuple swapped in atomically). While it is in use, a background
+    task replaces it BLOCKHASH_REFRESH_MARGIN_SECONDS before it expires, and
+    concurrent fetches (from any thread or event loop) share a single RPC call.
+    The refresh task stops once nobody has read the blockhash for a full
+    lifetime and restarts on the next read.
+    """
+    
+    def __init__(self):
+        self._current: Optional[Blockhash] = None
+        self._last_read = 0.0
+        self._inflight: Optional[Future] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        
+    def peek(self) -> Optional[Blockhash]:
+        """The cached blockhash if it is still valid, without waiting or locking"""
+        current = self._current
+        now = time.monotonic()
+        self._last_read = now
+        if current is not None and now < current.expires_at:
+            return current
+        return None
+        
+    async def get(self) -> Blockhash:
+        """The cached blockhash, fetched first if there is no valid one"""
+        self._ensure_refresher()
+        return self.peek() or await self.refresh()
+        
+    def expired(self, blockhash: Blockhash) -> bool:
+        """Whether transactions signed with a blockhash can no longer land"""
+        return time.monotonic() >= blockhash.expires_at
+        
+    async def refresh(self) -> Blockhash:
+        """Fetch a new blockhash; callers arriving during a fetch wait for the same one"""
+        with self._lock:
+            future = self._inflight
+            leader = future is None
+            if leader:
+                future = self._inflight = Future()
+        if not leader:
+            return await asyncio.wrap_future(future)
+        
+        try:
+            blockhash = await fetch_latest_blockhash()
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Blockhash fetch was cancelled"))
+            raise
+        else:
+            self._current = blockhash
+            future.set_result(blockhash)
+            return blockhash
+        finally:
+            with self._lock:
+                self._inflight = None
+        
+    def _ensure_refresher(self):
+        refresher = self._refresher
+        if refresher is not None and not refresher.done() and not refresher.get_loop().is_closed():
+            return
+        with self._lock:
+            if self._refresher is refresher:
+                self._refresher = asyncio.get_running_loop().create_task(self._refresh_loop())
+        
+    async def _refresh_loop(self):
+        while time.monotonic() - self._last_read < config.BLOCKHASH_TTL_SECONDS:
+            current = self._current
+            delay = current.expires_at - config.BLOCKHASH_REFRESH_MARGIN_SECONDS - time.monotonic() if current else 0
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Refreshing the recent blockhash failed: {e}")
+                await asyncio.sleep(1)
+
+# Process-wide blockhash cache used by the transaction layer
+blockhash_cache = BlockhashCache()
+
+def _decode_sender_keypair(sender_secret_key) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Decode a sender secret key into raw keypair bytes.
+    
+    Args:
+        sender_secret_key: Secret key (a base58 string or a list of integers)
+        
+    Returns:
+        tuple: The keypair bytes and None, or None and an error message
+    """
+    # Check if we have a valid secret key (either as base58 string or list of integers)
+    if not sender_secret_key:
+        return None, "No sender secret key provided"
+    
+    # Log the type of secret key for debugging (without revealing the key itself)
+    logger.debug(f"Secret key type: {type(sender_secret_key).__name__}")
+    
+    # Handle both string and list formats for the secret key
+    try:
+        if isinstance(sender_secret_key, str):
+            # Handle base58 string format
+            logger.debug("Processing sender secret key from base58 string")
+            try:
+                key_bytes = base58.b58decode(sender_secret_key)
+                logger.debug(f"Successfully decoded key (length: {len(key_bytes)} bytes)")
+            except Exception as e:
+                logger.error(f"Failed to decode base58 key: {e}")
+                return None, "Invalid sender secret key format (not valid base58)"
+        elif isinstance(sender_secret_key, list):
+            # Handle array of integers format
+            logger.debug("Processing sender secret key from integer array")
+            # Validate that we have bytes in the correct range
+            if not all(0 <= b <= 255 for b in sender_secret_key):
+                return None, "Invalid sender secret key format (values not in byte range)"
+            key_bytes = bytes(sender_secret_key)
+        else:
+            return None, f"Unsupported secret key format: {type(sender_secret_key).__name__}"
+    except Exception as e:
+        logger.error(f"Error processing secret key: {e}")
+        return None, "Invalid secret key format"
+    
+    return key_bytes, None
+
+def to_raw_amount(token_amount: float, token_decimals: int) -> int:
+    """
+    Convert a token amount to integer base units of the mint.
+    Goes through Decimal so amounts like 0.1 do not pick up float error.
+    
+    Args:
+        token_amount: Amount of tokens
+        token_decimals: Number of decimal places for the token
+        
+    Returns:
+        int: Amount in base units (rounded down)
+    """
+    scaled = Decimal(str(token_amount)).scaleb(token_decimals)
+    return int(scaled.to_integral_value(rounding=ROUND_DOWN))
+
+class AirdropContext:
+    """
+    Transfer parameters shared by every recipient of an airdrop, resolved once per event.
+    Building the context validates the mint, decodes the sender keypair,
+    derives its token account and computes the raw amount and the
+    TransferChecked instruction data, so the per-recipient path is pure data
+    assembly. If anything is unusable,
+    `error` says why and nothing should be sent.
+    """
+    
+    def __init__(self, token_mint: str, token_amount: float, token_decimals: int, sender_secret_key=None):
+        self.token_mint = token_mint
+        self.token_amount = token_amount
+        self.token_decimals = int(token_decimals or 0)
+        self.error: Optional[str] = None
+        self.mint_bytes = b""
+        self.sender_keypair: Optional[bytes] = None
+        self.sender_public_key: Optional[str] = None
+        self.source_token_account: Optional[str] = None
+        self.raw_amount = 0
+        self.transfer_data = b""
+        self._message_header = b""
+        # Existence of recipient token accounts looked up during this airdrop
+        self._accounts_exist: Dict[str, bool] = {}
+        self.error = self._resolve(sender_secret_key)
+        
+    def _resolve(self, sender_secret_key) -> Optional[str]:
+        if not validate_solana_address(self.token_mint):
+            return f"Invalid token mint: {self.token_mint}"
+        self.mint_bytes = base58.b58decode(self.token_mint)
+        
+        self.sender_keypair, key_error = _decode_sender_keypair(sender_secret_key)
+        if key_error:
+            return key_error
+        if len(self.sender_keypair) == 64:
+            # Solana keypairs are the 32-byte secret followed by the public key
+            self.sender_public_key = base58.b58encode(self.sender_keypair[32:]).decode()
+            self.source_token_account = derive_token_address(self.sender_public_key, self.token_mint)
+        
+        if not 0 <= self.token_decimals <= 255:
+            return f"Invalid token decimals: {self.token_decimals}"
+        try:
+            self.raw_amount = to_raw_amount(self.token_amount, self.token_decimals)
+        except (InvalidOperation, ValueError, OverflowError):
+            return f"Invalid token amount: {self.token_amount}"
+        if not 0 <= self.raw_amount <= _MAX_U64:
+            return f"Invalid token amount: {self.token_amount}"
+        
+        # TransferChecked data: instruction index, u64 amount (little endian), u8 decimals
+        self.transfer_data = (
+            bytes([_TRANSFER_CHECKED_INSTRUCTION])
+            + self.raw_amount.to_bytes(8, "little")
+            + bytes([self.token_decimals])
+        )
+        source = base58.b58decode(self.source_token_account) if self.source_token_account else b""
+        self._message_header = self.mint_bytes + source + self.sender_keypair[32:]
+        return None
+        
+    async def prefetch_accounts(self, token_accounts: List[str]):
+        """
+        Look up which recipient token accounts already exist, in batches
+        (see fetch_accounts_exist). Results are kept for the rest of the
+        airdrop, so accounts already looked up are not fetched again.
+        """
+        if not config.SOLANA_RPC_READS:
+            return
+        unknown = [address for address in dict.fromkeys(token_accounts) if address not in self._accounts_exist]
+        if unknown:
+            self._accounts_exist.update(await fetch_accounts_exist(unknown))
+        
+    def needs_account(self, token_account: str) -> bool:
+        """
+        Whether a transfer must create the recipient token account first.
+        Accounts that could not be looked up are created idempotently to be safe.
+        """
+        if not config.SOLANA_RPC_READS:
+            return False
+        return not self._accounts_exist.get(token_account, False)
+        
+    def transfer_message(self, destinations: List[str], creates: Iterable[Tuple[str, str]] = ()) -> bytes:
+        """
+        Assemble the transfer payload for a group of recipients from the
+        precomputed templates. Destinations must already be validated.
+        
+        Args:
+            destinations: Recipient token account addresses
+            creates: (owner wallet, token account) pairs of accounts to create first
+            
+        Returns:
+            bytes: Mint and sender header, account creations, then one transfer per recipient
+        """
+        parts = [self._message_header]
+        for owner, token_account in creates:
+            parts.append(base58.b58decode(owner))
+            parts.append(base58.b58decode(token_account))
+            parts.append(bytes([_CREATE_IDEMPOTENT_INSTRUCTION]))
+        for destination in destinations:
+            parts.append(base58.b58decode(destination))
+            parts.append(self.transfer_data)
+        return b"".join(parts)
+        
+    def sign(self, message: bytes, blockhash: Blockhash) -> str:
+        """
+        Sign a transfer payload together with its recent blockhash.
+        This is a mock signature for development: a digest of the payload and
+        blockhash, so re-signing with a new blockhash gives a new signature.
+        """
+        return hashlib.sha256(message + base58.b58decode(blockhash.value)).hexdigest()
 
 async def process_withdrawal_transaction(
     wallet_address: str,
@@ -173,7 +805,6 @@ async def process_withdrawal_transaction(
         # 2. Sign and send the transaction
         
         # For mock implementation, generate a fake signature
-        import hashlib
         fake_signature = hashlib.sha256(
             f"withdraw-{wallet_address}-{token_mint}-{token_amount}-{fee_amount}-{datetime.utcnow().isoformat()}".encode()
         ).hexdigest()
@@ -200,7 +831,9 @@ async def process_airdrop_transaction(
     token_mint: str,
     token_amount: float,
     token_decimals: int,
-    sender_secret_key=None
+    sender_secret_key=None,
+    context: Optional[AirdropContext] = None,
+    before_send: Optional[Callable[[dict], Awaitable[None]]] = None
 ) -> dict:
     """
     Process a single airdrop transaction.
@@ -212,6 +845,9 @@ async def process_airdrop_transaction(
         token_amount: Amount of tokens to send
         token_decimals: Number of decimal places for the token
         sender_secret_key: Secret key for the sender wallet (can be a base58 string or a list of integers)
+        context: Pre-resolved airdrop parameters; built from the other arguments if not given
+        before_send: Called with the signed result before the transaction is
+                     sent, to record its signature; if it raises, nothing is sent
         
     Returns:
         dict: Result of the transaction with signature or error
@@ -226,79 +862,135 @@ async def process_airdrop_transaction(
                 "success": False,
                 "error": f"Invalid wallet address: {wallet_address}"
             }
-            
-        if not validate_solana_address(token_mint):
-            return {
-                "success": False,
-                "error": f"Invalid token mint: {token_mint}"
-            }
         
-        # Check if we have a valid secret key (either as base58 string or list of integers)
-        if not sender_secret_key:
+        if context is None:
+            context = AirdropContext(token_mint, token_amount, token_decimals, sender_secret_key)
+        if context.error:
             return {
                 "success": False,
-                "error": "No sender secret key provided"
+                "error": context.error
             }
         
-        # Log the type of secret key for debugging (without revealing the key itself)
-        logger.debug(f"Secret key type: {type(sender_secret_key).__name__}")
+        # Send to the recipient's associated token account, creating it if needed
+        token_account = derive_token_address(wallet_address, context.token_mint)
+        await context.prefetch_accounts([token_account])
+        creates = [(wallet_address, token_account)] if context.needs_account(token_account) else []
         
-        # Handle both string and list formats for the secret key
-        try:
-            import base58
-            
-            if isinstance(sender_secret_key, str):
-                # Handle base58 string format
-                logger.debug("Processing sender secret key from base58 string")
-                try:
-                    # Try to decode the base58 string to verify it's valid
-                    key_bytes = base58.b58decode(sender_secret_key)
-                    logger.debug(f"Successfully decoded key (length: {len(key_bytes)} bytes)")
-                except Exception as e:
-                    logger.error(f"Failed to decode base58 key: {e}")
-                    return {
-                        "success": False,
-                        "error": "Invalid sender secret key format (not valid base58)"
-                    }
-            elif isinstance(sender_secret_key, list):
-                # Handle array of integers format
-                logger.debug("Processing sender secret key from integer array")
-                # Validate that we have bytes in the correct range
-                if not all(0 <= b <= 255 for b in sender_secret_key):
-                    return {
-                        "success": False,
-                        "error": "Invalid sender secret key format (values not in byte range)"
-                    }
-            else:
+        # Sign with the shared recent blockhash
+        blockhash = await blockhash_cache.get()
+        signature = context.sign(context.transfer_message([token_account], creates), blockhash)
+        result = {
+            "success": True,
+            "signature": signature,
+            "timestamp": datetime.utcnow().isoformat(),
+            "blockhash": blockhash.value,
+            "last_valid_block_height": blockhash.last_valid_block_height
+        }
+        
+        if before_send is not None:
+            try:
+                await before_send(result)
+            except Exception as e:
+                logger.error(f"Could not record transaction {signature} before sending: {e}")
                 return {
                     "success": False,
-                    "error": f"Unsupported secret key format: {type(sender_secret_key).__name__}"
+                    "error": f"Could not record transaction before sending: {e}"
                 }
-        except ImportError:
-            logger.warning("base58 module not available, skipping key validation")
-        except Exception as e:
-            logger.error(f"Error processing secret key: {e}")
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error in airdrop transaction: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+async def process_airdrop_batch_transaction(
+    wallet_addresses: List[str],
+    context: AirdropContext,
+    token_accounts: Optional[List[str]] = None,
+    before_send: Optional[Callable[[dict], Awaitable[None]]] = None
+) -> dict:
+    """
+    Process one transaction carrying transfers to several recipients.
+    The transaction succeeds or fails as a unit: every recipient shares the
+    resulting signature or error. This is a mock implementation for development.
+    
+    Args:
+        wallet_addresses: Validated recipient wallet addresses (see pack_transfers)
+        context: Airdrop parameters resolved once for the event
+        token_accounts: Recipients' associated token accounts, in the same order
+                        (derived here if not given; see TokenAccount.resolve)
+        before_send: Called with the signed result before the transaction is
+                     sent, to record its signature; if it raises, nothing is sent
+        
+    Returns:
+        dict: Result of the transaction with signature, or error and whether it is retryable
+    """
+    try:
+        logger.info(
+            f"Mock airdrop: Sending {context.token_amount} tokens to {len(wallet_addresses)} wallets in one transaction"
+        )
+        
+        if not wallet_addresses:
             return {
                 "success": False,
-                "error": "Invalid secret key format"
+                "error": "No recipients in transaction"
             }
         
-        # For mock implementation, generate a fake signature
-        import hashlib
-        fake_signature = hashlib.sha256(
-            f"{wallet_address}-{token_mint}-{token_amount}-{datetime.utcnow().isoformat()}".encode()
-        ).hexdigest()
+        if context.error:
+            return {
+                "success": False,
+                "error": context.error
+            }
         
-        # Return a success response
-        return {
+        # Transfers are made to each recipient's associated token account,
+        # created in the same transaction when it does not exist yet
+        if token_accounts is None:
+            token_accounts = derive_token_addresses(wallet_addresses, context.token_mint)
+        creates = [
+            (wallet_address, token_account)
+            for wallet_address, token_account in zip(wallet_addresses, token_accounts)
+            if context.needs_account(token_account)
+        ]
+        
+        if estimate_transfer_transaction_size(len(wallet_addresses), len(creates)) > PACKET_DATA_SIZE:
+            return {
+                "success": False,
+                "error": f"Too many transfers for one transaction: {len(wallet_addresses)}"
+            }
+        
+        # One signature for the whole transaction, over the shared recent blockhash
+        blockhash = await blockhash_cache.get()
+        signature = context.sign(context.transfer_message(token_accounts, creates), blockhash)
+        result = {
             "success": True,
-            "signature": fake_signature,
-            "timestamp": datetime.utcnow().isoformat()
+            "signature": signature,
+            "timestamp": datetime.utcnow().isoformat(),
+            "transfers": len(wallet_addresses),
+            "blockhash": blockhash.value,
+            "last_valid_block_height": blockhash.last_valid_block_height
         }
         
+        if before_send is not None:
+            try:
+                await before_send(result)
+            except Exception as e:
+                logger.error(f"Could not record transaction {signature} before sending: {e}")
+                # Nothing was sent, so it is safe to try again
+                return {
+                    "success": False,
+                    "error": f"Could not record transaction before sending: {e}",
+                    "retryable": True
+                }
+        
+        return result
+        
     except Exception as e:
-        logger.error(f"Error in airdrop transaction: {e}")
+        logger.error(f"Error in airdrop batch transaction: {e}")
         return {
             "success": False,
-            "error": str(e)
+            "error": str(e) or type(e).__name__,
+            "retryable": is_transient_error(e)
         }
@@ -0,0 +1,298 @@
+"""
+Durable airdrop job queue for the Solana Airdrop Bot.
+Pending AirdropTransaction rows are the queue: workers claim them in chunks
+under a time-limited lease, dispatch them and write the results back.
+Leases are renewed while a worker is alive, so rows left behind by a crashed
+or restarted process are picked up again once their lease expires, and any
+number of worker processes can drain the same airdrop without double-sending.
+Transfers that failed transiently wait in the queue until their retry
+backoff has passed (see dispatch.write_transaction_results).
+
+Run standalone worker processes with: python worker.py
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+
+import config
+from app import app, db
+from confirmation import ConfirmationTracker
+from dispatch import AirdropDispatcher, load_airdrop_context
+from models import AirdropTransaction
+from utils import AirdropContext
+
+logger = logging.getLogger(__name__)
+
+# In-process worker started by the web application or the Telegram bot
+_worker: Optional["AirdropWorker"] = None
+_worker_thread: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def _claimable(now: datetime):
+    """Filter for pending transactions that are due and no live worker holds a lease on"""
+    return and_(
+        AirdropTransaction.status == 'pending',
+        or_(
+            AirdropTransaction.lease_expires_at.is_(None),
+            AirdropTransaction.lease_expires_at < now
+        ),
+        or_(
+            AirdropTransaction.next_attempt_at.is_(None),
+            AirdropTransaction.next_attempt_at <= now
+        )
+    )
+
+
+def claim_transactions(worker_id: str, limit: int, lease_seconds: int) -> Tuple[Optional[int], List[Tuple[int, str]]]:
+    """
+    Claim a chunk of pending transactions from the oldest airdrop with work left.
+    On PostgreSQL the candidate rows are locked with FOR UPDATE SKIP LOCKED so
+    concurrent workers claim disjoint chunks. SQLite has no row locks, but it
+    serializes writers, so the single UPDATE ... WHERE id IN (SELECT ...) is
+    atomic there as well.
+
+    Args:
+        worker_id: Identifier of the claiming worker
+        limit: Maximum number of transactions to claim
+        lease_seconds: How long the claim is valid without a heartbeat
+
+    Returns:
+        tuple: Airdrop event ID and its claimed (transaction ID, wallet address) pairs
+    """
+    with app.app_context():
+        now = datetime.utcnow()
+        try:
+            event_id = db.session.execute(
+                select(AirdropTransaction.event_id)
+                .where(_claimable(now))
+                .order_by(AirdropTransaction.id)
+                .limit(1)
+            ).scalar()
+            if event_id is None:
+                return None, []
+
+            candidates = (
+                select(AirdropTransaction.id)
+                .where(AirdropTransaction.event_id == event_id, _claimable(now))
+                .order_by(AirdropTransaction.id)
+                .limit(limit)
+            )
+            if db.engine.dialect.name == 'postgresql':
+                candidates = candidates.with_for_update(skip_locked=True)
+
+            claimed = db.session.execute(
+                update(AirdropTransaction)
+                .where(AirdropTransaction.id.in_(candidates.scalar_subquery()))
+                .values(lease_owner=worker_id, lease_expires_at=now + timedelta(seconds=lease_seconds))
+                .returning(AirdropTransaction.id, AirdropTransaction.wallet_address)
+                .execution_options(synchronize_session=False)
+            ).tuples().all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    claimed.sort()
+    return event_id, claimed
+
+
+def renew_leases(worker_id: str, lease_seconds: int) -> int:
+    """Extend the leases of all pending transactions held by a worker"""
+    with app.app_context():
+        try:
+            result = db.session.execute(
+                update(AirdropTransaction)
+                .where(
+                    AirdropTransaction.lease_owner == worker_id,
+                    AirdropTransaction.status == 'pending'
+                )
+                .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return result.rowcount
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def seconds_until_retry() -> Optional[float]:
+    """Time until the earliest unclaimed transfer waiting out a retry backoff is due, or None if there is none"""
+    with app.app_context():
+        now = datetime.utcnow()
+        due = db.session.execute(
+            select(func.min(AirdropTransaction.next_attempt_at))
+            .where(
+                AirdropTransaction.status == 'pending',
+                AirdropTransaction.next_attempt_at.isnot(None),
+                or_(
+                    AirdropTransaction.lease_expires_at.is_(None),
+                    AirdropTransaction.lease_expires_at < now
+                )
+            )
+        ).scalar()
+    if due is None:
+        return None
+    return max(0.0, (due - now).total_seconds())
+
+
+class AirdropWorker:
+    """
+    Drains the airdrop job queue.
+    Each iteration claims a chunk of pending transactions, dispatches it with
+    an AirdropDispatcher and keeps the chunk's leases alive until its results
+    have been written. A ConfirmationTracker on the same event loop settles
+    the transactions sent.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, batch_size: Optional[int] = None,
+                 lease_seconds: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.batch_size = batch_size or config.AIRDROP_CLAIM_BATCH_SIZE
+        self.lease_seconds = lease_seconds or config.AIRDROP_LEASE_SECONDS
+        self.poll_interval = poll_interval or config.AIRDROP_WORKER_POLL_SECONDS
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        # Resolved parameters of the airdrop being drained, reused across its chunks
+        self._context: Optional[AirdropContext] = None
+        self._context_event_id: Optional[int] = None
+
+    def wake(self):
+        """Wake the worker up to look for new work (thread-safe)"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def stop(self):
+        """Ask the worker to stop after the current chunk (thread-safe)"""
+        self._stopping = True
+        self.wake()
+
+    async def run(self, drain: bool = False):
+        """
+        Process queued transactions until stopped.
+
+        Args:
+            drain: Return as soon as the queue is empty, no retry is waiting
+                   and every sent transaction is settled, instead of waiting
+                   for work
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        logger.info(f"Airdrop worker {self.worker_id} started")
+
+        # Sent transactions are confirmed on a timer of their own
+        tracker = ConfirmationTracker(self.worker_id, lease_seconds=self.lease_seconds)
+        tracking = asyncio.create_task(tracker.run())
+
+        while not self._stopping:
+            try:
+                event_id, recipients = await asyncio.to_thread(
+                    claim_transactions, self.worker_id, self.batch_size, self.lease_seconds
+                )
+            except Exception as e:
+                logger.error(f"Airdrop worker {self.worker_id} could not claim work: {e}")
+                event_id, recipients = None, []
+
+            if recipients:
+                try:
+                    await self._process(event_id, recipients)
+                except Exception as e:
+                    # The chunk stays pending and is claimed again once its leases expire
+                    logger.error(f"Airdrop worker {self.worker_id} failed on airdrop {event_id}: {e}")
+                continue
+
+            # Transient failures come back on their own once their backoff passes
+            try:
+                retry_in = await asyncio.to_thread(seconds_until_retry)
+            except Exception as e:
+                logger.error(f"Airdrop worker {self.worker_id} could not look up retries: {e}")
+                retry_in = None
+            if drain and retry_in is None:
+                break
+            try:
+                timeout = self.poll_interval if retry_in is None else min(self.poll_interval, retry_in)
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+        if drain and not self._stopping:
+            tracker.drain()
+        else:
+            tracker.stop()
+        await tracking
+        logger.info(f"Airdrop worker {self.worker_id} stopped")
+
+    def run_forever(self):
+        """Run the worker on a new event loop (thread target)"""
+        asyncio.run(self.run())
+
+    async def _process(self, event_id: int, recipients: List[Tuple[int, str]]):
+        """
+        Dispatch one claimed chunk while keeping its leases alive.
+        The heartbeat runs until the dispatcher has saved every result (see
+        ResultWriter.close), so the chunk is never released with outcomes
+        that exist only in memory.
+        """
+        if self._context_event_id != event_id:
+            self._context = await asyncio.to_thread(load_airdrop_context, event_id)
+            self._context_event_id = event_id if self._context is not None else None
+        if self._context is None:
+            logger.error(f"Airdrop {event_id} not found, leaving {len(recipients)} transactions pending")
+            return
+
+        logger.info(f"Worker {self.worker_id} claimed {len(recipients)} transactions of airdrop {event_id}")
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await AirdropDispatcher().run(
+                event_id=event_id,
+                recipients=recipients,
+                context=self._context
+            )
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self):
+        """Periodically renew the leases of the chunk being dispatched"""
+        while True:
+            await asyncio.sleep(max(1, self.lease_seconds // 3))
+            try:
+                await asyncio.to_thread(renew_leases, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.warning(f"Airdrop worker {self.worker_id} could not renew leases: {e}")
+
+
+def start_worker() -> AirdropWorker:
+    """
+    Start the in-process airdrop worker if it is not already running.
+    On startup the worker resumes any transactions left pending by a
+    previous process.
+    """
+    global _worker, _worker_thread
+    with _worker_lock:
+        if _worker_thread is None or not _worker_thread.is_alive():
+            _worker = AirdropWorker()
+            _worker_thread = threading.Thread(target=_worker.run_forever, name="airdrop-worker")
+            _worker_thread.daemon = True
+            _worker_thread.start()
+        return _worker
+
+
+def enqueue_airdrop(event_id: int):
+    """Signal that an airdrop has pending transactions ready to dispatch"""
+    start_worker().wake()
+    logger.info(f"Airdrop {event_id} queued for dispatch")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG if config.DEBUG else logging.INFO)
+    asyncio.run(AirdropWorker().run())